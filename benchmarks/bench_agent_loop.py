@@ -0,0 +1,289 @@
+"""
+Agent 主循环离线基准测试。
+
+启动本地 OpenAI 兼容模拟服务（见 fake_openai_server.py）按脚本回放工具调用序列，
+并用 fixtures 替换搜索、SQL、代码执行等工具，只测量 agent 自身的开销：
+- turns/s：每秒完成的对话轮次（chat）或研究任务（research）
+- 各阶段耗时：模型调用（含模拟延迟）、工具执行、agent 自身开销
+- 峰值内存（tracemalloc）
+
+工作负载：chat 为多轮对话；budget 为工具调用轮数上限（TASK_MAX_TOOL_ROUNDS=1）小于脚本轮数的对话，
+每轮都经过执行预算用尽后以 tool_choice="none" 强制给出最终回答的路径；research 为研究任务。
+
+用法：
+    python benchmarks/bench_agent_loop.py [--turns 50] [--latency-ms 0] [--workloads chat,budget,research] [--repeat 3]
+    python benchmarks/bench_agent_loop.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_agent_loop.py --baseline other.json --max-regression 0.25
+
+默认与仓库中的 benchmarks/baseline.json 比较：未指定 --turns/--latency-ms/--jitter-ms 时沿用基线的运行参数，
+任一指标比基线差超过 --max-regression 即以退出码 1 结束，可直接用于CI；--no-compare 跳过比较。
+运行参数与基线不一致时结果不可比，只打印结果不做比较。
+耗时类指标（turns_per_sec、overhead_ms_per_turn）先除以同一次运行中固定参考计算的耗时（reference_ms）再比较，
+不同机器的快慢差异不会被误判为回归；overhead_ms_per_turn 的变化小于 0.5 ms 时不计为回归。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import builtins
+import tempfile
+import contextlib
+import statistics
+import tracemalloc
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import OpenAI # type: ignore
+from mymanus_agent.agent import mymanusClass  # noqa: E402
+from fake_openai_server import FakeChatServer, MODEL_ID  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+_DEFAULT_CONFIG = {'turns': 50, 'latency_ms': 0.0, 'jitter_ms': 0.0}
+
+# 指标名 -> 数值越大越好(True) / 越小越好(False)
+_METRIC_DIRECTIONS = {
+    'turns_per_sec': True,
+    'model_calls': False,
+    'overhead_ms_per_turn': False,
+    'peak_kb': False,
+}
+# 耗时类指标按参考耗时归一化：指标名 -> 归一化时乘(True)/除(False)以 reference_ms
+_TIME_METRICS = {'turns_per_sec': True, 'overhead_ms_per_turn': False}
+# 低于该绝对变化量的差异视为测量噪声
+_METRIC_FLOORS = {'overhead_ms_per_turn': 0.5}
+
+def _serve(script, latency_ms, jitter_ms, queue):
+    server = FakeChatServer(('127.0.0.1', 0), script, latency_ms=latency_ms, jitter_ms=jitter_ms)
+    queue.put(server.server_address[1])
+    server.serve_forever()
+
+class PhaseTimer:
+    def __init__(self):
+        self.samples = {'model': [], 'tool': []}
+
+    def reset(self):
+        for values in self.samples.values():
+            values.clear()
+
+    def wrap(self, phase, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.samples[phase].append(time.perf_counter() - start)
+        return timed
+
+def reference_ms(repeat=5):
+    """
+    固定的参考计算（消息列表的JSON序列化与解析，与 agent 自身开销的构成相近）的耗时中位数，
+    用于把耗时类指标换算为与机器快慢无关的相对值。
+    """
+    messages = [{'role': 'user', 'content': '请分析一下用户流失情况' * 20, 'index': i} for i in range(200)]
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(20):
+            json.loads(json.dumps(messages, ensure_ascii=False))
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+@contextlib.contextmanager
+def _env(**values):
+    original = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in original.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def build_agent(base_url, tool_outputs, timer):
+    client = OpenAI(api_key='bench', base_url=base_url, max_retries=0)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        agent = mymanusClass(model=MODEL_ID, client=client, check_models=False)
+    # 工具已替换为 fixtures，关闭会访问真实网络的搜索预取
+    agent.search_prefetch = False
+    completions = agent.client.chat.completions
+    completions.create = timer.wrap('model', completions.create)
+    for name in list(agent.available_functions):
+        output = tool_outputs.get(name, '')
+        agent.available_functions[name] = timer.wrap('tool', lambda output=output, **kwargs: output)
+    return agent
+
+@contextlib.contextmanager
+def _scripted_input(answers):
+    answers = iter(answers)
+    original = builtins.input
+    builtins.input = lambda prompt='': next(answers)
+    try:
+        yield
+    finally:
+        builtins.input = original
+
+def _run_workload(agent, workload, turns):
+    if workload == 'chat':
+        with _scripted_input(['请分析一下用户流失情况'] * turns + ['退出']):
+            agent.chat()
+    elif workload == 'budget':
+        with _env(TASK_MAX_TOOL_ROUNDS='1'), _scripted_input(['请分析一下用户流失情况'] * turns + ['退出']):
+            agent.chat()
+    else:
+        for _ in range(turns):
+            with _scripted_input(['重点关注合约类型与在网时长']):
+                agent.research_task(question='用户流失的主要原因是什么？')
+            agent.clear_messages()
+
+def run_benchmark(base_url, workload, turns, tool_outputs):
+    timer = PhaseTimer()
+    agent = build_agent(base_url, tool_outputs, timer)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # 预热一轮，排除首次连接与导入的开销
+        _run_workload(agent, workload, 1)
+        agent.clear_messages()
+        timer.reset()
+
+        start = time.perf_counter()
+        _run_workload(agent, workload, turns)
+        wall = time.perf_counter() - start
+
+        model_total = sum(timer.samples['model'])
+        tool_total = sum(timer.samples['tool'])
+        model_calls = len(timer.samples['model'])
+
+        agent.clear_messages()
+        tracemalloc.start()
+        _run_workload(agent, workload, max(1, turns // 5))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        'turns': turns,
+        'wall_s': round(wall, 4),
+        'turns_per_sec': round(turns / wall, 2) if wall else 0.0,
+        'model_calls': model_calls,
+        'model_p50_ms': round(_percentile(timer.samples['model'], 50) * 1000, 3),
+        'model_p95_ms': round(_percentile(timer.samples['model'], 95) * 1000, 3),
+        'tool_mean_ms': round(statistics.mean(timer.samples['tool']) * 1000, 4) if timer.samples['tool'] else 0.0,
+        'overhead_ms_per_turn': round((wall - model_total - tool_total) / turns * 1000, 3),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+def _normalized(metric, value, ref):
+    if metric not in _TIME_METRICS or not ref:
+        return value
+    return value * ref if _TIME_METRICS[metric] else value / ref
+
+def check_regressions(results, baseline, max_regression):
+    """
+    :param results: 本次结果（含 reference_ms）
+    :param baseline: 基线结果（含 reference_ms）
+    :return: 超出阈值的退化说明列表
+    """
+    failures = []
+    ref, base_ref = results.get('reference_ms'), baseline.get('reference_ms')
+    for workload, metrics in results.items():
+        if not isinstance(metrics, dict):
+            continue
+        for metric, higher_is_better in _METRIC_DIRECTIONS.items():
+            base = baseline.get(workload, {}).get(metric)
+            if not base:
+                continue
+            current = metrics[metric]
+            if abs(current - base) < _METRIC_FLOORS.get(metric, 0):
+                continue
+            norm_base = _normalized(metric, base, base_ref if ref else None)
+            norm_current = _normalized(metric, current, ref if base_ref else None)
+            change = (norm_base - norm_current) / norm_base if higher_is_better else (norm_current - norm_base) / norm_base
+            if change > max_regression:
+                note = f"，按参考耗时 {base_ref}→{ref} ms 换算" if metric in _TIME_METRICS and ref and base_ref else ""
+                failures.append(f"{workload}.{metric}: 基线 {base}，当前 {current}（退化 {change:.0%}{note}）")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description='Agent主循环离线基准测试')
+    parser.add_argument('--script', default=os.path.join(FIXTURES_DIR, 'agent_script.json'))
+    parser.add_argument('--tool-outputs', default=os.path.join(FIXTURES_DIR, 'tool_outputs.json'))
+    parser.add_argument('--workloads', default='chat,budget,research')
+    parser.add_argument('--turns', type=int, help=f"默认沿用基线参数，没有基线时为 {_DEFAULT_CONFIG['turns']}")
+    parser.add_argument('--latency-ms', type=float, help='模拟服务每次响应的延迟')
+    parser.add_argument('--jitter-ms', type=float)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线结果JSON，用于回归检查')
+    parser.add_argument('--no-compare', action='store_true', help='不与基线比较')
+    parser.add_argument('--repeat', type=int, default=3, help='每个工作负载重复运行的次数，取吞吐最高的一次以压低调度噪声')
+    parser.add_argument('--max-regression', type=float, default=0.25, help='允许的最大退化比例')
+    parser.add_argument('--save-baseline', help='将本次结果及运行参数保存为基线JSON')
+    args = parser.parse_args()
+
+    baseline = None
+    if not args.no_compare and args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    elif not args.no_compare and args.baseline != DEFAULT_BASELINE:
+        parser.error(f"基线文件不存在: {args.baseline}")
+    base_config = (baseline or {}).get('config', _DEFAULT_CONFIG)
+    config = {
+        'turns': args.turns if args.turns is not None else base_config['turns'],
+        'latency_ms': args.latency_ms if args.latency_ms is not None else base_config['latency_ms'],
+        'jitter_ms': args.jitter_ms if args.jitter_ms is not None else base_config['jitter_ms'],
+    }
+
+    with open(args.script, 'r', encoding='utf-8') as f:
+        script = json.load(f)
+    with open(args.tool_outputs, 'r', encoding='utf-8') as f:
+        tool_outputs = json.load(f)
+
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    server_proc = ctx.Process(target=_serve, args=(script, config['latency_ms'], config['jitter_ms'], queue), daemon=True)
+    server_proc.start()
+    base_url = f"http://127.0.0.1:{queue.get(timeout=30)}/v1"
+
+    results = {'reference_ms': reference_ms()}
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            # 研究任务会写出报告文件，放到临时目录中
+            os.chdir(work_dir)
+            for workload in args.workloads.split(','):
+                runs = [run_benchmark(base_url, workload, config['turns'], tool_outputs) for _ in range(max(1, args.repeat))]
+                results[workload] = max(runs, key=lambda r: r['turns_per_sec'])
+            os.chdir(cwd)
+    finally:
+        os.chdir(cwd)
+        server_proc.terminate()
+
+    print(json.dumps(results, ensure_ascii=False, indent=4))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'results': results}, f, ensure_ascii=False, indent=4)
+            f.write('\n')
+        print(f"基线已保存到: {args.save_baseline}")
+
+    if baseline is not None:
+        if base_config != config:
+            print(f"运行参数 {config} 与基线 {base_config} 不一致，跳过基线比较。")
+            return
+        failures = check_regressions(results, baseline['results'], args.max_regression)
+        if failures:
+            print("性能回归：")
+            for line in failures:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("未发现性能回归。")
+
+if __name__ == '__main__':
+    main()
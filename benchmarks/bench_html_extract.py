@@ -0,0 +1,152 @@
+"""
+HTML 正文抽取基准测试。
+
+对 fixtures 目录下保存的HTML页面分别运行三种抽取方式，统计吞吐（pages/s）与峰值内存：
+- legacy: 每次构建完整DOM并重新解析XPath字符串，字符串 += 拼接（旧版 get_search_text 的做法）；
+          未匹配站点规则的页面同样先解码再构建DOM，使用通用抽取器
+- dom:    完整DOM + 预编译XPath + 通用抽取器兜底（extract_page 的默认路径）
+- stream: 增量解析，命中目标节点后提前停止（HTML_EXTRACT_STREAM=1 时启用）
+
+用法：
+    python benchmarks/bench_html_extract.py [--fixtures DIR] [--repeat N] [--chunk-size BYTES]
+
+fixtures 目录下的 urls.json 记录每个HTML文件对应的原始URL，用于匹配站点规则。
+计时前先检查 stream 与 dom 两种方式对每个页面的抽取结果完全一致，不一致时以退出码 1 结束。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tracemalloc
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import etree # type: ignore
+from mymanus_agent.tools.html_extract import (  # noqa: E402
+    SITE_RULES, match_site_rule, extract_from_tree, readability_extract, extract_page, page_to_text
+)
+
+_DOM_PARSER = etree.HTMLParser(encoding='utf-8')
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'html')
+
+_LEGACY_XPATHS = {
+    'zhihu_question': ('//div/div[1]/div/h1/text()', '//div/div/div/div[2]/div/div[2]/div/div/div[2]/span[1]/div/div/span/p/text()', None),
+    'zhuanlan': ('//div[1]/div/main/div/article/header/h1/text()', '//div/main/div/article/div[1]/div/div/div/p/text()', '//div/main/div/article/div[1]/div/div/div//pre/code/text()'),
+    'zhihu_answer': ('//div/div[1]/div/h1/text()', '//div[contains(@class, "AnswerItem")]//div[contains(@class, "RichContent-inner")]//span[contains(@class, "RichText")]//p/text()', None),
+}
+
+def _legacy_extract(raw, url):
+    rule_name = match_site_rule(url)
+    res_xpath = etree.HTML(raw.decode('utf-8'))
+    if rule_name is None:
+        page = readability_extract(res_xpath)
+        return page['title'], page_to_text(page)
+    title_xp, text_xp, code_xp = _LEGACY_XPATHS[rule_name]
+    title = res_xpath.xpath(title_xp)
+    text_content = ''
+    for t_item in res_xpath.xpath(text_xp):
+        txt = str(t_item).replace('\n', ' ').strip()
+        if txt: text_content += txt + " "
+    if code_xp:
+        for c_item in res_xpath.xpath(code_xp):
+            text_content += "\n```\n" + str(c_item).replace('\n', ' ').strip() + "\n```\n"
+    return title[0] if title else None, text_content.strip()
+
+def _dom_extract(raw, url):
+    root = etree.HTML(raw, parser=_DOM_PARSER)
+    rule_name = match_site_rule(url)
+    page = extract_from_tree(root, rule_name) if rule_name in SITE_RULES else None
+    if not page or not page['paragraphs']:
+        page = readability_extract(root)
+    return page['title'], page_to_text(page)
+
+def _stream_extract(raw, url, chunk_size):
+    chunks = (raw[i:i + chunk_size] for i in range(0, len(raw), chunk_size))
+    page = extract_page(chunks, url, stream=True)
+    return page['title'], page_to_text(page)
+
+def _run_mode(mode, pages, repeat, chunk_size, queue):
+    # 在独立子进程中运行，保证各模式的峰值内存互不干扰
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    extracted = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for raw, url in pages:
+            if mode == 'legacy':
+                result = _legacy_extract(raw, url)
+            elif mode == 'dom':
+                result = _dom_extract(raw, url)
+            else:
+                result = _stream_extract(raw, url, chunk_size)
+            if result and result[0] and result[1]:
+                extracted += 1
+    elapsed = time.perf_counter() - start
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    total = repeat * len(pages)
+    queue.put({
+        'mode': mode,
+        'pages': total,
+        'extracted': extracted,
+        'seconds': round(elapsed, 4),
+        'pages_per_second': round(total / elapsed, 1) if elapsed else float('inf'),
+        'py_peak_kb': round(py_peak / 1024, 1),
+        'rss_growth_kb': rss_after - rss_before,
+    })
+
+def load_fixtures(fixtures_dir):
+    with open(os.path.join(fixtures_dir, 'urls.json'), 'r', encoding='utf-8') as f:
+        urls = json.load(f)
+    pages = []
+    for name, url in sorted(urls.items()):
+        with open(os.path.join(fixtures_dir, name), 'rb') as f:
+            pages.append((f.read(), url))
+    return pages
+
+def check_consistency(pages, chunk_size):
+    """
+    :return: stream 与 dom 抽取结果不一致的页面URL列表
+    """
+    return [url for raw, url in pages if _stream_extract(raw, url, chunk_size) != _dom_extract(raw, url)]
+
+def main():
+    parser = argparse.ArgumentParser(description='HTML正文抽取基准测试')
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES, help='保存HTML页面及urls.json的目录')
+    parser.add_argument('--repeat', type=int, default=50, help='每个页面重复抽取的次数')
+    parser.add_argument('--chunk-size', type=int, default=64 * 1024, help='流式解析每次喂入的字节数')
+    parser.add_argument('--modes', default='legacy,dom,stream', help='逗号分隔的测试模式')
+    args = parser.parse_args()
+
+    pages = load_fixtures(args.fixtures)
+    print(f"共载入 {len(pages)} 个页面，每个页面重复 {args.repeat} 次。")
+    mismatched = check_consistency(pages, args.chunk_size)
+    if mismatched:
+        print(f"stream 与 dom 的抽取结果不一致: {', '.join(mismatched)}")
+        sys.exit(1)
+
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for mode in args.modes.split(','):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_mode, args=(mode, pages, args.repeat, args.chunk_size, queue))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0:
+            print(f"模式 {mode} 运行失败，退出码 {proc.exitcode}")
+            continue
+        results.append(queue.get())
+
+    header = f"{'mode':<8}{'pages':>8}{'ok':>6}{'pages/s':>12}{'py_peak_kb':>14}{'rss_growth_kb':>16}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['mode']:<8}{r['pages']:>8}{r['extracted']:>6}{r['pages_per_second']:>12}{r['py_peak_kb']:>14}{r['rss_growth_kb']:>16}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+本地 OpenAI 兼容模拟服务，用于离线基准测试，不消耗任何API额度。
+
+按脚本回放模型响应：对每个 /v1/chat/completions 请求，统计最后一条 user 消息之后
+已有多少轮助手工具调用，以此作为脚本中的步骤序号返回对应的 tool_calls 或最终文本。
+未携带 tools 的请求（例如 research_task 的引导提问）返回脚本中的 plain_reply。
+tool_choice 为 "none" 的请求（例如执行预算用尽后强制给出最终回答）不返回工具调用，
+而是返回脚本中最后一个文本步骤（没有时返回 final_reply）。
+
+脚本格式（JSON）：
+{
+    "plain_reply": "引导提问文本",
+    "final_reply": "强制给出的最终回答（可选）",
+    "steps": [
+        {"tool_calls": [{"name": "sql_inter", "arguments": {"sql_query": "SHOW TABLES;"}}], "latency_ms": 20},
+        {"content": "最终回答"}
+    ]
+}
+arguments 为字符串时原样返回，可用于回放格式有误的工具参数。
+
+用法：
+    python benchmarks/fake_openai_server.py --script benchmarks/fixtures/agent_script.json --port 8765 --latency-ms 50
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODEL_ID = 'fake-bench-model'
+
+def _approx_tokens(obj):
+    return max(1, len(json.dumps(obj, ensure_ascii=False)) // 4)
+
+class FakeChatServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, script, latency_ms=0.0, jitter_ms=0.0):
+        super().__init__(address, _Handler)
+        self.script = script
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.request_count = 0
+        self._lock = threading.Lock()
+
+    def pick_step(self, payload):
+        messages = payload.get('messages', [])
+        if not payload.get('tools'):
+            return {'content': self.script.get('plain_reply', '好的。')}
+        steps = self.script.get('steps', [])
+        if payload.get('tool_choice') == 'none':
+            finals = [step for step in steps if step.get('content')]
+            return finals[-1] if finals else {'content': self.script.get('final_reply', '脚本已结束。')}
+        last_user = max((i for i, m in enumerate(messages) if m.get('role') == 'user'), default=-1)
+        rounds = sum(1 for m in messages[last_user + 1:] if m.get('role') == 'assistant' and m.get('tool_calls'))
+        if rounds < len(steps):
+            return steps[rounds]
+        return steps[-1] if steps and 'content' in steps[-1] else {'content': '脚本已结束。'}
+
+    def sleep_for(self, step):
+        latency = step.get('latency_ms', self.latency_ms)
+        if self.jitter_ms:
+            latency += random.uniform(0, self.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头与响应体分两次写出，关闭Nagle算法避免与延迟确认叠加产生约40ms的额外等待
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body, status=200):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json({'object': 'list', 'data': [{'id': MODEL_ID, 'object': 'model', 'created': 0, 'owned_by': 'bench'}]})
+        else:
+            self._send_json({'error': {'message': 'not found'}}, status=404)
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json({'error': {'message': 'not found'}}, status=404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        server = self.server
+        with server._lock:
+            server.request_count += 1
+            request_id = server.request_count
+        step = server.pick_step(payload)
+        server.sleep_for(step)
+
+        message = {'role': 'assistant', 'content': step.get('content')}
+        finish_reason = 'stop'
+        if step.get('tool_calls'):
+            message['content'] = None
+            message['tool_calls'] = [{
+                'id': f"call_{request_id}_{i}",
+                'type': 'function',
+                'function': {'name': call['name'], 'arguments': call['arguments'] if isinstance(call['arguments'], str)
+                             else json.dumps(call['arguments'], ensure_ascii=False)},
+            } for i, call in enumerate(step['tool_calls'])]
+            finish_reason = 'tool_calls'
+
+        prompt_tokens = _approx_tokens(payload.get('messages', []))
+        completion_tokens = _approx_tokens(message)
+        self._send_json({
+            'id': f"chatcmpl-bench-{request_id}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': payload.get('model', MODEL_ID),
+            'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens},
+        })
+
+def start_server(script, host='127.0.0.1', port=0, latency_ms=0.0, jitter_ms=0.0):
+    """
+    在后台线程中启动模拟服务，返回 (server, base_url)。调用 server.shutdown() 停止。
+    """
+    server = FakeChatServer((host, port), script, latency_ms=latency_ms, jitter_ms=jitter_ms)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description='本地OpenAI兼容模拟服务')
+    parser.add_argument('--script', required=True, help='脚本JSON文件路径')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='每次响应的固定延迟')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='在固定延迟上叠加的随机延迟上限')
+    args = parser.parse_args()
+
+    with open(args.script, 'r', encoding='utf-8') as f:
+        script = json.load(f)
+    server = FakeChatServer((args.host, args.port), script, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    print(f"模拟服务已启动: http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,24 @@
 import os
 import json
+import atexit
+import re
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv # type: ignore
 from openai import OpenAI # type: ignore 
 
-from .tools.python_tools import python_inter, fig_inter
+from .tools.python_tools import python_inter, fig_inter, release_python_session, close_python_worker
 from .tools.sql_tools import sql_inter, extract_data
-from .tools.search_tools import get_answer, get_answer_github
+from .tools.profile_tools import profile_table
+from .tools.search_tools import get_answer, get_answer_github, SEARCH_FLIGHTS
+from .tools.knowledge_index import search_local_knowledge
 from .tools.utils import print_code_if_exists, save_markdown_to_file
+from .tools.shared_data import SharedDataPlane
+from .tools.namespace_memory import NamespaceMemory
+from .tools.prefetch import SearchPrefetcher
+from .llm_cache import LLMResponseCache
+from .model_router import ModelRouter
+from .governor import TaskBudget, parse_tool_limits
+from .tool_args import ToolArgumentValidator, REPAIR_LABELS
 
 load_dotenv(override=True)
 
@@ -16,7 +28,13 @@ class mymanusClass:
                  model=None,
                  base_url=None,
                  messages=None,
-                 tools_config=None):
+                 tools_config=None,
+                 client=None,
+                 check_models=True):
+        """
+        :param client: 可选，预先构造好的 OpenAI 兼容客户端（例如基准测试中的本地模拟服务），传入时不再自行创建
+        :param check_models: 初始化时是否调用 models.list() 检查模型可用性
+        """
         
         self.api_key = api_key if api_key is not None else os.getenv("API_KEY")
         self.model_name = model if model is not None else os.getenv("MODEL")
@@ -29,32 +47,62 @@ class mymanusClass:
             # 初始系统消息，只在第一次创建实例或clear_messages后设置
             self.messages = [{"role":"system", "content":"你是MyManus,是大师级的智能助手。"}]
             
-        if not all([self.api_key, self.model_name, self.base_url]):
-            print("错误：API_KEY, MODEL, 或 BASE_URL 未配置。请检查.env文件或初始化参数。")
-            self.client = None
-            return
+        # LLM_CACHE_MODE 控制模型响应缓存：off / cache / record / replay
+        self.llm_cache = LLMResponseCache()
+        # MODEL_FAST / MODEL_STRONG 配置模型档位，按调用阶段路由；未配置时全部使用 MODEL
+        self.router = ModelRouter(self.model_name)
+        # 最近一轮对话或研究任务的预算消耗（TASK_MAX_TOOL_ROUNDS 等环境变量配置上限），供监控使用；
+        # 并行子任务各自使用独立的 TaskBudget，不写入该字段
+        self.last_budget_usage = None
+        # RESEARCH_PREFETCH=1 时，research_task 在等待用户补充说明期间后台预取搜索结果
+        self.search_prefetch = os.getenv("RESEARCH_PREFETCH", "1") == "1"
+        replay_only = self.llm_cache.mode == 'replay'
 
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        if client is None and not all([self.api_key, self.model_name, self.base_url]):
+            if not (replay_only and self.model_name):
+                print("错误：API_KEY, MODEL, 或 BASE_URL 未配置。请检查.env文件或初始化参数。")
+                self.client = None
+                return
+            # 回放模式不访问网络，使用占位配置构造客户端
+            client = OpenAI(api_key=self.api_key or "replay", base_url=self.base_url or "http://replay.invalid/v1")
+
+        self.client = client if client is not None else OpenAI(api_key=self.api_key, base_url=self.base_url)
         
         self.available_functions = {
             "python_inter": python_inter,
             "fig_inter": fig_inter,
             "sql_inter": sql_inter,
             "extract_data": extract_data,
+            "profile_table": profile_table,
             "get_answer": get_answer,
             "get_answer_github": get_answer_github,
+            "search_local_knowledge": search_local_knowledge,
         }
         self.tools_definitions = tools_config if tools_config else self._get_default_tools_definitions()
-        # 初始化 g_namespace 用于 python_inter, fig_inter, extract_data
+        # 按工具定义校验并在本地修复模型给出的工具参数
+        self.tool_args = ToolArgumentValidator(self.tools_definitions)
+        # 初始化 g_namespace 用于 python_inter, fig_inter, extract_data, profile_table
         self.g_namespace = {} 
+        # PYTHON_EXEC_MODE=process 时 python_inter 在独立执行进程中运行，数据经共享数据平面按引用传递
+        self.python_exec_mode = os.getenv("PYTHON_EXEC_MODE", "inline")
+        self.data_plane = SharedDataPlane() if self.python_exec_mode == "process" else None
+        atexit.register(self._close_data_plane)
+        # 超出 NAMESPACE_MEMORY_BUDGET_MB 时，最久未使用的大变量落盘，代码再次引用时自动重新加载
+        self.namespace_memory = NamespaceMemory(self.g_namespace, data_plane=self.data_plane)
+        atexit.register(self._close_namespace)
+
+        if not check_models or replay_only:
+            print("▌ mymanus初始化完成（已跳过模型检查），欢迎使用！")
+            return
 
         try:
             print("正在测试模型能否正常调用...")
             models_list = self.client.models.list()
             if models_list and models_list.data:
                 available_model_names = [m.id for m in models_list.data]
-                if self.model_name not in available_model_names:
-                    print(f"警告：配置的模型 '{self.model_name}' 不在可用模型列表中。可用模型: {available_model_names}")
+                for tier_model in dict.fromkeys([self.model_name] + list(self.router.tiers.values())):
+                    if tier_model not in available_model_names:
+                        print(f"警告：配置的模型 '{tier_model}' 不在可用模型列表中。可用模型: {available_model_names}")
                 print("▌ mymanus初始化完成，欢迎使用！")
             else:
                 print("未能获取到模型列表，请检查API Key和Base URL配置以及网络连接。")
@@ -65,8 +113,10 @@ class mymanusClass:
         python_inter_args_example = '{"py_code": "import numpy as np\\narr = np.array([1, 2, 3, 4])\\nsum_arr = np.sum(arr)\\nsum_arr"}'
         sql_inter_args_example = '{"sql_query": "SHOW TABLES;"}'
         extract_data_args_example = '{"sql_query": "SELECT * FROM user_churn", "df_name": "user_churn"}'
+        profile_table_args_example = '{"table": "user_churn"}'
         get_answer_args_example = '{"q": "什么是MCP?"}'
         get_answer_github_args_example = '{"q": "DeepSeek-R1"}'
+        search_local_knowledge_args_example = '{"q": "MCP协议"}'
         return [
             {
                 "type": "function",
@@ -99,10 +149,14 @@ class mymanusClass:
                 "type": "function",
                 "function": {
                     "name": "sql_inter",
-                    "description": f"当用户需要进行数据库查询工作时，请调用该函数。该函数用于在指定MySQL服务器上运行一段SQL代码，完成数据查询相关工作，并且当前函数是使用pymsql连接MySQL数据库。本函数只负责运行SQL代码并进行数据查询，若要进行数据提取，则使用另一个extract_data函数。同时需要注意，编写外部函数的参数消息时，必须是满足json格式的字符串，例如如以下形式字符串就是合规字符串：{sql_inter_args_example}",
+                    "description": f"当用户需要进行数据库查询工作时，请调用该函数。该函数用于在指定MySQL服务器上运行一段SQL代码，完成数据查询相关工作，并且当前函数是使用pymsql连接MySQL数据库。本函数只负责运行SQL代码并进行数据查询，如需查询本地CSV/Parquet数据文件，可将backend参数设为local。若要进行数据提取，则使用另一个extract_data函数。同时需要注意，编写外部函数的参数消息时，必须是满足json格式的字符串，例如如以下形式字符串就是合规字符串：{sql_inter_args_example}",
                     "parameters": {
                         "type": "object",
-                        "properties": {"sql_query": {"type": "string", "description": "The SQL query to execute in MySQL database."}},
+                        "properties": {
+                            "sql_query": {"type": "string", "description": "The SQL query to execute in MySQL database."},
+                            "backend": {"type": "string", "enum": ["mysql", "local"], "description": "可选。SQL后端：mysql 为MySQL服务器；local 为本地数据目录中的CSV/Parquet文件（每个文件对应一张同名表）。不填时使用默认配置。"},
+                            "use_cache": {"type": "boolean", "description": "可选，默认为 true。只读查询会复用本会话中相同查询的缓存结果；如需获取最新数据，请设为 false。"}
+                        },
                         "required": ["sql_query"]
                     }
                 }
@@ -111,17 +165,36 @@ class mymanusClass:
                 "type": "function",
                 "function": {
                     "name": "extract_data",
-                    "description": f"用于在MySQL数据库中提取一张表到当前Python环境中，注意，本函数只负责数据表的提取，并不负责数据查询，若需要在MySQL中进行数据查询，请使用sql_inter函数。同时需要注意，编写外部函数的参数消息时，必须是满足json格式的字符串，例如如以下形式字符串就是合规字符串：{extract_data_args_example}",
+                    "description": f"用于在MySQL数据库中提取一张表到当前Python环境中，注意，本函数只负责数据表的提取，并不负责数据查询，若需要在MySQL中进行数据查询，请使用sql_inter函数。对于大表，请尽量只提取需要的列并在SQL中完成过滤和聚合，避免无约束的 SELECT *，否则可能收到警告或被拒绝执行。同时需要注意，编写外部函数的参数消息时，必须是满足json格式的字符串，例如如以下形式字符串就是合规字符串：{extract_data_args_example}",
                     "parameters": {
                         "type": "object",
                         "properties": {
                             "sql_query": {"type": "string", "description": "The SQL query to extract a table from MySQL database."},
-                            "df_name": {"type": "string", "description": "The name of the variable to store the extracted table in the local environment."}
+                            "df_name": {"type": "string", "description": "The name of the variable to store the extracted table in the local environment."},
+                            "explain": {"type": "boolean", "description": "可选。为 true 时先对查询执行 EXPLAIN，并返回预估扫描行数与代价。"},
+                            "backend": {"type": "string", "enum": ["mysql", "local"], "description": "可选。SQL后端：mysql 为MySQL服务器；local 为本地数据目录中的CSV/Parquet文件（每个文件对应一张同名表）。不填时使用默认配置。"},
+                            "use_cache": {"type": "boolean", "description": "可选，默认为 true。只读查询会复用本会话中相同查询的缓存结果；如需获取最新数据，请设为 false。"}
                         },
                         "required": ["sql_query", "df_name"]
                     }
                 }
             },
+            {
+                "type": "function",
+                "function": {
+                    "name": "profile_table",
+                    "description": f"数据画像工具，一次调用返回数据表或DataFrame每一列的类型、空值率、不同值个数、分位数、高频值以及数值列之间的相关性。开始分析一张表时，请优先调用该函数了解数据全貌，而不是用python_inter逐列编写统计代码；大表的统计会下推到数据库执行，无需先提取到本地。示例参数：{profile_table_args_example}",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "table": {"type": "string", "description": "数据库中的表名。与 df_name 二选一。"},
+                            "df_name": {"type": "string", "description": "当前Python环境中已有的DataFrame变量名。与 table 二选一。"},
+                            "backend": {"type": "string", "enum": ["mysql", "local"], "description": "可选。SQL后端：mysql 为MySQL服务器；local 为本地数据目录中的CSV/Parquet文件。不填时使用默认配置。"},
+                            "max_tokens": {"type": "integer", "description": "可选。画像文本的token预算，列较多时会压缩高频值或省略末尾的列。"}
+                        }
+                    }
+                }
+            },
             {
                 "type": "function",
                 "function": {
@@ -145,21 +218,71 @@ class mymanusClass:
                         "required": ["q"]
                     }
                 }
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "search_local_knowledge",
+                    "description": f"本地知识库检索工具，检索以往联网搜索保存的知乎页面、GitHub README以及历史研究报告，毫秒级返回。需要查找资料时请优先调用该函数，若返回内容不足以回答问题，再调用get_answer或get_answer_github联网搜索。示例参数：{search_local_knowledge_args_example}",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {"q": {"type": "string", "description": "需要检索的问题或关键词，用字符串形式进行表示。"}},
+                        "required": ["q"]
+                    }
+                }
             }
         ]
 
-    def _chat_base_agent(self, current_messages_for_api_call):
-        # 这个方法现在直接修改传入的 current_messages_for_api_call 列表
+    def _routed_completion(self, phase, **request):
+        """
+        所有模型调用的统一入口：先由模型路由按阶段选择档位，再经过响应缓存（按 LLM_CACHE_MODE 工作）。
+        :return: (ChatCompletion, 实际使用的档位)
+        """
+        return self.router.complete(lambda **req: self.llm_cache.create(self.client, **req), phase, request)
+
+    def _create_chat_completion(self, phase="synthesis", **request):
+        """
+        :param phase: 调用阶段（clarify / plan / tool_routing / synthesis），决定使用的模型档位
+        """
+        return self._routed_completion(phase, **request)[0]
+
+    def _chat_base_agent(self, current_messages_for_api_call, g_namespace=None, max_tool_rounds=None, max_tokens=None,
+                         escalate_final=False, budget=None, namespace_memory=None):
+        """
+        带工具调用循环的模型对话。直接修改传入的 current_messages_for_api_call 列表。
+        工具选择轮次使用快速档位。escalate_final 为True时（只用于研究报告等汇总步骤），工具执行后的请求直接使用
+        synthesis 阶段的档位，最终回答由强档位一次生成；只有未调用任何工具、快速档位直接给出回答时才由强档位重新生成。
+        普通对话直接使用快速档位的回答，每轮只需一次模型调用。
+        循环受执行预算约束：每次请求的最后一条工具结果后附上剩余预算（只加在发给模型的请求中，不写入消息历史），
+        预算用尽时不再执行工具并强制模型给出最终回答。预算消耗可通过传入的 budget.usage() 查看。
+        :param g_namespace: Python 工具使用的命名空间，为 None 时使用实例的 g_namespace
+        :param max_tool_rounds: 工具调用轮数上限，覆盖 TASK_MAX_TOOL_ROUNDS
+        :param max_tokens: 每次模型调用的输出token上限
+        :param escalate_final: 最终回答是否升级到 synthesis 阶段对应的档位
+        :param budget: 执行预算（TaskBudget），为 None 时按环境变量新建
+        :param namespace_memory: 命名空间的内存管理器（NamespaceMemory），传入时使用其管理的命名空间
+        """
         if not self.client:
             print("客户端未初始化。")
             return None # 或者返回一个表示错误的特定响应
+        if namespace_memory is not None:
+            g_namespace = namespace_memory.namespace
+        elif g_namespace is None:
+            g_namespace = self.g_namespace
+            namespace_memory = self.namespace_memory
+        if budget is None:
+            budget = TaskBudget(max_rounds=max_tool_rounds)
+        extra_params = {"max_tokens": max_tokens} if max_tokens else {}
         try:
-            response = self.client.chat.completions.create(
+            response, tier = self._routed_completion(
+                "tool_routing",
                 model=self.model_name,  
                 messages=current_messages_for_api_call, # 使用传入的消息列表
                 tools=self.tools_definitions,
-                tool_choice="auto"
+                tool_choice="auto",
+                **extra_params
             )
+            budget.record_response(response, current_messages_for_api_call)
         except Exception as e:
             print(f"模型调用报错: {str(e)}")
             return None
@@ -173,36 +296,55 @@ class mymanusClass:
         while tool_calls: 
             print("模型请求工具调用...")
             # 将模型的工具调用请求添加到传入的消息列表中
-            current_messages_for_api_call.append(response_message.model_dump()) # type: ignore
+            assistant_message = response_message.model_dump() # type: ignore
+            current_messages_for_api_call.append(assistant_message)
             
             for tool_call in tool_calls:
                 function_name = tool_call.function.name
                 function_args_str = tool_call.function.arguments
                 print(f"调用工具: {function_name}，参数: {function_args_str}")
-                try:
-                    function_args = json.loads(function_args_str)
-                except json.JSONDecodeError as e:
-                    print(f"解析工具参数失败: {e}")
-                    function_response_content = f"错误：工具 '{function_name}' 的参数不是有效的JSON: {function_args_str}"
+                function_args, arg_error, repairs = self.tool_args.parse(function_name, function_args_str)
+                if arg_error:
+                    print(arg_error)
                     current_messages_for_api_call.append({ # 添加到传入的消息列表
                         "tool_call_id": tool_call.id,
                         "role": "tool",
                         "name": function_name,
-                        "content": function_response_content,
+                        "content": arg_error,
                     })
                     continue
+                if repairs:
+                    print(f"已在本地修复工具参数：{'、'.join(REPAIR_LABELS[kind] for kind in repairs)}")
+                    # 历史消息中改为修复后的参数，避免模型在后续轮次中沿用错误格式
+                    for call in assistant_message.get('tool_calls') or []:
+                        if call.get('id') == tool_call.id:
+                            call['function']['arguments'] = json.dumps(function_args, ensure_ascii=False)
 
                 print_code_if_exists(function_args=function_args)
 
-                if function_name in self.available_functions:
+                rejection = budget.allow_tool(function_name)
+                if rejection:
+                    print(rejection)
+                    function_response_content = rejection
+                elif function_name in self.available_functions:
                     function_to_call = self.available_functions[function_name]
-                    if function_name in ["python_inter", "fig_inter", "extract_data"]:
-                        function_args['g_namespace'] = self.g_namespace # 使用实例的 g_namespace
+                    if function_name in ["python_inter", "fig_inter", "extract_data", "profile_table"]:
+                        function_args['g_namespace'] = g_namespace
+                        if namespace_memory is not None:
+                            namespace_memory.prepare(function_args.get('df_name') if function_name == "profile_table"
+                                                     else function_args.get('py_code'))
+                    if self.data_plane is not None and function_name in ["python_inter", "extract_data"]:
+                        function_args['data_plane'] = self.data_plane
                     try:
                         function_response_content = function_to_call(**function_args)
                     except Exception as e_func:
                         print(f"工具 '{function_name}' 执行失败: {e_func}")
                         function_response_content = f"错误: 工具 '{function_name}' 执行时发生错误: {str(e_func)}"
+                    if namespace_memory is not None and function_name in ["python_inter", "fig_inter", "extract_data"]:
+                        spilled = namespace_memory.enforce_budget()
+                        if spilled:
+                            print(f"命名空间超出内存预算，已将变量 {', '.join(spilled)} 落盘。")
+                            print(namespace_memory.memory_report())
                 else:
                     print(f"未找到工具: {function_name}")
                     function_response_content = f"错误: 未知的工具 '{function_name}'"
@@ -214,24 +356,57 @@ class mymanusClass:
                     "content": str(function_response_content),
                 })
             
+            budget.record_round()
+            # 把剩余预算附在本次请求的最后一条工具结果后，让模型据此规划后续调用；消息历史中不保留该说明
+            request_messages = current_messages_for_api_call
+            budget_note = budget.remaining_note()
+            if budget_note and current_messages_for_api_call[-1].get("role") == "tool":
+                last_message = current_messages_for_api_call[-1]
+                request_messages = current_messages_for_api_call[:-1] + [
+                    dict(last_message, content=last_message["content"] + "\n\n" + budget_note)]
+
             print("所有工具调用处理完毕，再次请求模型...")
+            stop_reason = budget.exhausted()
+            if stop_reason:
+                budget.stop_reason = stop_reason
+                print(f"{stop_reason}，要求模型直接给出最终回答。")
             try:
-                response = self.client.chat.completions.create(
+                response, tier = self._routed_completion(
+                    # 汇总步骤中工具执行后的回复通常就是最终回答，直接交给强档位，避免快速档位回答后再重复生成
+                    "synthesis" if stop_reason or escalate_final else "tool_routing",
                     model=self.model_name,
-                    messages=current_messages_for_api_call, # 使用更新后的消息列表
+                    messages=request_messages, # 使用更新后的消息列表（附带剩余预算说明）
                     tools=self.tools_definitions,
-                    tool_choice="auto"
+                    tool_choice="none" if stop_reason else "auto",
+                    **extra_params
                 )
+                budget.record_response(response, request_messages)
                 if response and response.choices and len(response.choices) > 0:
                     response_message = response.choices[0].message
                     tool_calls = getattr(response_message, 'tool_calls', None)
-                    if response.choices[0].finish_reason != "tool_calls": 
+                    if response.choices[0].finish_reason != "tool_calls" or stop_reason: 
                         tool_calls = None 
                 else: 
                     tool_calls = None
             except Exception as e:
                 print(f"模型再次调用报错: {str(e)}")
                 return None
+
+        final_tier = self.router.select_tier("synthesis", current_messages_for_api_call)
+        if escalate_final and response is not None and self.router.tiers[tier] != self.router.tiers[final_tier]:
+            # 快速档位已完成工具选择，最终回答交给强档位生成
+            try:
+                response = self._create_chat_completion(
+                    "synthesis",
+                    model=self.model_name,
+                    messages=current_messages_for_api_call,
+                    tools=self.tools_definitions,
+                    tool_choice="none",
+                    **extra_params
+                )
+                budget.record_response(response, current_messages_for_api_call)
+            except Exception as e:
+                print(f"强档位生成最终回答失败，沿用快速档位的回答: {str(e)}")
         return response
 
     def chat(self):
@@ -245,7 +420,9 @@ class mymanusClass:
         # 确保 self.messages 的第一个消息是 system message (如果它是空的或不符合预期)
         if not self.messages or self.messages[0].get("role") != "system":
             self.messages = [{"role":"system", "content":"你mymanus，是一名助人为乐的助手。"}]
+            self._close_namespace()
             self.g_namespace = {} # 如果重置消息，也重置g_namespace
+            self.namespace_memory = NamespaceMemory(self.g_namespace, data_plane=self.data_plane)
 
         while True:
             try:
@@ -254,9 +431,14 @@ class mymanusClass:
                 print("输入结束，对话终止。")
                 break
             if question.lower() == "退出":
+                if self.router.multi_tier:
+                    print(f"模型档位使用情况：\n{self.router.summary()}")
+                if self.tool_args.summary():
+                    print(self.tool_args.summary())
                 print("感谢使用mymanus，再见！")
                 break  
                 
+            self.router.begin_task()
             self.messages.append({"role": "user", "content": question})
             # 限制历史消息长度（可选），操作 self.messages
             if len(self.messages) > 20: # 例如保留最近20条（包括系统消息）
@@ -264,7 +446,9 @@ class mymanusClass:
                 self.messages = [self.messages[0]] + self.messages[-19:]
             
             # _chat_base_agent 会直接修改 self.messages 列表
-            response = self._chat_base_agent(current_messages_for_api_call=self.messages) 
+            budget = TaskBudget()
+            response = self._chat_base_agent(current_messages_for_api_call=self.messages, budget=budget)
+            self.last_budget_usage = budget.usage()
             
             if response and response.choices and response.choices[0].message and response.choices[0].message.content:
                 final_content = response.choices[0].message.content
@@ -279,10 +463,104 @@ class mymanusClass:
                 if self.messages and self.messages[-1].get("role") == "user":
                     self.messages.pop()
 
-    def research_task(self, question):
+    def _plan_sub_questions(self, question, max_sub_questions):
+        """
+        让模型把研究问题拆解为若干可独立调研的子问题。
+        :return: 子问题字符串列表，拆解失败时返回空列表
+        """
+        plan_prompt = f"""
+        请将下面的研究问题拆解为不超过{max_sub_questions}个相互独立、可以分别调研的子问题，子问题之间不要有先后依赖。
+        只输出一个JSON字符串数组，不要输出任何其他内容，例如：["子问题1", "子问题2"]
+        研究问题：{question}
+        """
+        try:
+            response = self._create_chat_completion(
+                "plan",
+                model=self.model_name,
+                messages=[{"role": "user", "content": plan_prompt}]
+            )
+            content = response.choices[0].message.content or ""
+        except Exception as e:
+            print(f"子问题拆解失败: {e}")
+            return []
+        match = re.search(r"\[.*\]", content, re.S)
+        if not match:
+            return []
+        try:
+            sub_questions = json.loads(match.group(0))
+        except json.JSONDecodeError:
+            return []
+        return [str(q).strip() for q in sub_questions if str(q).strip()][:max_sub_questions]
+
+    def _research_sub_question(self, sub_question, question, budget_limits, max_tokens):
+        """
+        使用独立的消息列表、命名空间与执行预算调研单个子问题，返回 (子问题, 调研结论)。
+        :param budget_limits: 构造子问题 TaskBudget 的参数（max_rounds、deadline_s、tool_limits 等）
+        :param max_tokens: 每次模型调用的输出token上限
+        """
+        messages = [
+            {"role": "system", "content": "你是一名专业的研究助手，负责调研一个更大研究问题中的某个子问题。"},
+            {"role": "user", "content": f"总体研究问题：{question}\n你负责的子问题：{sub_question}\n"
+                                        f"请调用可用的外部工具收集信息，并给出该子问题的要点结论，注明关键事实与来源。"},
+        ]
+        # 每个子问题使用命名空间的浅拷贝，避免并发写入同名变量时相互覆盖
+        namespace_memory = self.namespace_memory.fork()
+        try:
+            response = self._chat_base_agent(current_messages_for_api_call=messages,
+                                             namespace_memory=namespace_memory,
+                                             max_tokens=max_tokens,
+                                             budget=TaskBudget(**budget_limits))
+        finally:
+            release_python_session(namespace_memory.namespace, self.data_plane)
+            namespace_memory.release()
+        if response and response.choices and response.choices[0].message.content:
+            return sub_question, response.choices[0].message.content
+        return sub_question, "（该子问题未能获得有效结论）"
+
+    def _research_parallel(self, question, sub_questions):
+        """
+        并发调研各子问题，再用一次模型调用汇总成最终报告。
+        """
+        max_workers = int(os.getenv("RESEARCH_MAX_WORKERS", "4"))
+        max_tokens = int(os.getenv("RESEARCH_SUB_MAX_TOKENS", "1500"))
+        # 每个子问题各自计数的执行预算：工具调用轮数、截止时间与单工具调用次数，未设置的限制沿用 TASK_* 环境变量
+        budget_limits = {
+            "max_rounds": int(os.getenv("RESEARCH_SUB_MAX_ROUNDS", "4")),
+            "deadline_s": float(os.getenv("RESEARCH_SUB_DEADLINE_S", os.getenv("TASK_DEADLINE_S", "0"))),
+            "tool_limits": parse_tool_limits(os.getenv("RESEARCH_SUB_TOOL_LIMITS", os.getenv("TASK_TOOL_LIMITS", ""))),
+        }
+        print(f"已拆解为 {len(sub_questions)} 个子问题，正在并发调研...")
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sub_questions)))) as pool:
+            findings = list(pool.map(
+                lambda sub_q: self._research_sub_question(sub_q, question, budget_limits, max_tokens),
+                sub_questions))
+
+        findings_text = "\n\n".join(f"### 子问题{i}：{sub_q}\n{result}"
+                                      for i, (sub_q, result) in enumerate(findings, 1))
+        synthesis_prompt = f"""
+        你是一位资深研究员。下面是围绕研究问题"{question}"分别调研各子问题得到的结论：
+        {findings_text}
+        请综合以上信息，提供详细、全面、专业且具有深度的解答，内容尽量达到2000字以上，严谨准确且富有洞察力，并说明结论所依据的调研发现。
+        """
+        try:
+            return self._create_chat_completion(
+                "synthesis",
+                model=self.model_name,
+                messages=[{"role": "user", "content": synthesis_prompt}]
+            )
+        except Exception as e:
+            print(f"汇总子问题结论时模型调用失败: {e}")
+            return None
+
+    def research_task(self, question, mode=None):
+        """
+        研究任务：先引导用户明确需求，再进行深度调研并保存报告。
+        :param mode: serial 为单一工具调用循环；parallel 先拆解子问题并发调研再汇总。为None时读取环境变量 RESEARCH_MODE
+        """
         if not self.client:
             print("无法执行研究任务：客户端未初始化。")
             return
+        self.router.begin_task()
 
         # research_task 使用 self.messages 作为基础，但添加特定的系统提示
         # current_research_messages = list(self.messages) # 开始于当前会话历史
@@ -305,7 +583,7 @@ class mymanusClass:
         prompt_style2_template = """
         你是一位知识广博、擅长利用多种外部工具的资深研究员。当用户已明确提出具体需求：{new_question}，现在你的任务是：
         首先明确用户问题的核心及相关细节。
-        尽可能调用可用的外部工具（例如：联网搜索工具get_answer、GitHub搜索工具get_answer_github、本地代码运行工具python_inter以及其他工具），围绕用户给出的原始问题和补充细节，进行广泛而深入的信息收集。
+        尽可能调用可用的外部工具（例如：本地知识库检索工具search_local_knowledge、联网搜索工具get_answer、GitHub搜索工具get_answer_github、本地代码运行工具python_inter以及其他工具），围绕用户给出的原始问题和补充细节，进行广泛而深入的信息收集。
         综合利用你从各种工具中获取的信息，提供详细、全面、专业且具有深度的解答。你的回答应尽量达到2000字以上，内容严谨准确且富有洞察力。
         清晰展示你是如何运用各种外部工具进行深入研究并形成专业结论的。
         """
@@ -315,7 +593,8 @@ class mymanusClass:
         
         try:
             # 对于引导性提问，通常不需要工具调用，所以可以直接调用 completions.create
-            response1 = self.client.chat.completions.create(
+            response1 = self._create_chat_completion(
+                "clarify",
                 model=self.model_name,
                 messages=current_research_messages
             )
@@ -330,15 +609,21 @@ class mymanusClass:
         assistant_reply1 = response1.choices[0].message.content
         print(f"\n**mymanus (引导提问):**\n{assistant_reply1}\n")
         current_research_messages.append(response1.choices[0].message.model_dump())
-        
+
+        # 等待用户输入期间，后台预取原始问题的搜索结果、页面与README，深度研究时直接命中缓存
+        prefetcher = SearchPrefetcher().start(question) if self.search_prefetch else None
         try:
             new_question_input = input("请输入您的补充说明 (或直接回车使用原始问题，输入 退出 以结束): ")
         except EOFError:
             print("输入结束，研究任务终止。")
+            if prefetcher:
+                prefetcher.cancel()
             return None
 
         if new_question_input.lower() == "退出":
             print("研究任务已由用户终止。")
+            if prefetcher:
+                prefetcher.cancel()
             return None
         
         if not new_question_input.strip():
@@ -351,7 +636,21 @@ class mymanusClass:
         current_research_messages.append({"role": "user", "content": deep_dive_prompt})
             
         # 深度研究步骤可能需要工具调用
-        response2 = self._chat_base_agent(current_messages_for_api_call=current_research_messages) 
+        mode = (mode or os.getenv("RESEARCH_MODE", "serial")).lower()
+        sub_questions = []
+        if mode == "parallel":
+            # 拆解、子问题调研与汇总都使用原始问题加补充说明，避免只看到补充说明而偏离原始问题
+            full_question = f"{question}\n补充说明：{new_question_for_prompt2}"
+            sub_questions = self._plan_sub_questions(full_question, int(os.getenv("RESEARCH_MAX_SUB_QUESTIONS", "4")))
+            if not sub_questions:
+                print("未能拆解出子问题，改为串行深度研究。")
+        if sub_questions:
+            response2 = self._research_parallel(full_question, sub_questions)
+        else:
+            budget = TaskBudget()
+            response2 = self._chat_base_agent(current_messages_for_api_call=current_research_messages,
+                                              escalate_final=True, budget=budget)
+            self.last_budget_usage = budget.usage()
             
         if response2 and response2.choices and response2.choices[0].message and response2.choices[0].message.content:
             final_report_content = response2.choices[0].message.content
@@ -364,6 +663,15 @@ class mymanusClass:
             self.messages.append(response2.choices[0].message.model_dump())
         else:
             print("研究任务未能生成最终报告。")
+        if prefetcher:
+            prefetcher.cancel()
+        if self.router.multi_tier:
+            print(f"本次研究任务的模型档位使用情况：\n{self.router.summary()}")
+        flight_summary = SEARCH_FLIGHTS.summary()
+        if flight_summary:
+            print(f"联网请求合并情况：\n{flight_summary}")
+        if self.tool_args.summary():
+            print(self.tool_args.summary())
         
         # 限制 self.messages 长度
         if len(self.messages) > 20:
@@ -375,5 +683,27 @@ class mymanusClass:
         清除当前会话历史和Python工具的命名空间。
         """
         self.messages = [{"role":"system", "content":"你mymanus，是一名助人为乐的助手。"}]
+        self._close_namespace()
         self.g_namespace = {} # 清空python工具的命名空间
+        if getattr(self, 'data_plane', None) is not None:
+            self._close_data_plane()
+            self.data_plane = SharedDataPlane()
+        self.namespace_memory = NamespaceMemory(self.g_namespace, data_plane=self.data_plane)
         print("会话历史和Python命名空间已清除。")
+
+    def namespace_memory_report(self, top_n=10):
+        """
+        返回命名空间中最占内存的变量报告。
+        """
+        return self.namespace_memory.memory_report(top_n)
+
+    def _close_namespace(self):
+        namespace_memory = getattr(self, 'namespace_memory', None)
+        if namespace_memory is not None:
+            namespace_memory.close()
+
+    def _close_data_plane(self):
+        data_plane = getattr(self, 'data_plane', None)
+        if data_plane is not None and not data_plane.closed:
+            close_python_worker(data_plane)
+            data_plane.close()
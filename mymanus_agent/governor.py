@@ -0,0 +1,117 @@
+import os
+import time
+from .model_router import estimate_tokens
+
+def parse_tool_limits(spec):
+    """
+    解析形如 "get_answer=3,python_inter=10" 的单工具调用次数上限，取值为 0 的项表示不限制，不会被记录。
+    """
+    limits = {}
+    for item in (spec or '').split(','):
+        name, _, value = item.partition('=')
+        if name.strip() and value.strip().isdigit() and int(value):
+            limits[name.strip()] = int(value)
+    return limits
+
+class TaskBudget:
+    """
+    单个任务（一次 _chat_base_agent 工具调用循环）的执行预算：
+    工具调用轮数、token总量、截止时间与单个工具的调用次数。
+    任一限制用尽后，agent 不再执行工具，并要求模型基于已有信息给出最终回答。
+    取值为 0 或 None 的限制表示不限制。
+    """
+    def __init__(self, max_rounds=None, max_tokens=None, deadline_s=None, tool_limits=None):
+        self.max_rounds = max_rounds if max_rounds is not None else int(os.getenv('TASK_MAX_TOOL_ROUNDS', '10'))
+        self.max_tokens = max_tokens if max_tokens is not None else int(os.getenv('TASK_MAX_TOKENS', '0'))
+        self.deadline_s = deadline_s if deadline_s is not None else float(os.getenv('TASK_DEADLINE_S', '0'))
+        self.tool_limits = tool_limits if tool_limits is not None else parse_tool_limits(os.getenv('TASK_TOOL_LIMITS', ''))
+        self.started = time.monotonic()
+        self.rounds = 0
+        self.tokens = 0
+        self.model_calls = 0
+        self.tool_counts = {}
+        self.rejected_calls = 0
+        self.stop_reason = None
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def record_response(self, response, messages=None):
+        """
+        累计一次模型调用的token消耗，服务未返回 usage 时按字符数估算。
+        """
+        self.model_calls += 1
+        usage = getattr(response, 'usage', None)
+        if usage is not None and usage.total_tokens:
+            self.tokens += usage.total_tokens
+        elif response is not None:
+            content = response.choices[0].message.content if response.choices else ''
+            self.tokens += estimate_tokens(messages or []) + len(content or '') // 4
+
+    def record_round(self):
+        self.rounds += 1
+
+    def allow_tool(self, name):
+        """
+        检查并登记一次工具调用。
+        :return: 不允许调用时返回说明原因的错误信息，允许时返回 None
+        """
+        reason = self.exhausted()
+        if reason:
+            self.rejected_calls += 1
+            return f"错误：本任务的{reason}，已跳过工具 '{name}' 的调用，请基于已有信息作答。"
+        limit = self.tool_limits.get(name)
+        if limit and self.tool_counts.get(name, 0) >= limit:
+            self.rejected_calls += 1
+            return f"错误：工具 '{name}' 已达到本任务的调用上限（{limit} 次），请基于已有信息作答或改用其他工具。"
+        self.tool_counts[name] = self.tool_counts.get(name, 0) + 1
+        return None
+
+    def exhausted(self):
+        """
+        :return: 已用尽的限制说明，均未用尽时返回 None
+        """
+        if self.max_rounds and self.rounds >= self.max_rounds:
+            return f"工具调用轮数已达上限（{self.max_rounds} 轮）"
+        if self.max_tokens and self.tokens >= self.max_tokens:
+            return f"token预算已用尽（{self.tokens}/{self.max_tokens}）"
+        if self.deadline_s and self.elapsed() >= self.deadline_s:
+            return f"时间预算已用尽（{self.deadline_s:g} 秒）"
+        return None
+
+    def remaining_note(self):
+        """
+        生成反馈给模型的剩余预算说明。
+        """
+        reason = self.exhausted()
+        if reason:
+            return f"[执行预算] {reason}，不能再调用工具，请直接给出最终回答。"
+        parts = []
+        if self.max_rounds:
+            parts.append(f"工具调用轮数剩余 {self.max_rounds - self.rounds}/{self.max_rounds}")
+        if self.max_tokens:
+            parts.append(f"token剩余 {self.max_tokens - self.tokens}")
+        if self.deadline_s:
+            parts.append(f"时间剩余 {max(0.0, self.deadline_s - self.elapsed()):.0f} 秒")
+        for name, limit in self.tool_limits.items():
+            if not limit:
+                continue
+            parts.append(f"{name} 剩余 {max(0, limit - self.tool_counts.get(name, 0))} 次")
+        return f"[执行预算] {'，'.join(parts)}。" if parts else ""
+
+    def usage(self):
+        """
+        返回预算消耗情况，供监控使用。
+        """
+        return {
+            'rounds': self.rounds,
+            'max_rounds': self.max_rounds,
+            'tokens': self.tokens,
+            'max_tokens': self.max_tokens,
+            'elapsed_s': round(self.elapsed(), 3),
+            'deadline_s': self.deadline_s,
+            'model_calls': self.model_calls,
+            'tool_counts': dict(self.tool_counts),
+            'rejected_calls': self.rejected_calls,
+            'stop_reason': self.stop_reason,
+        }
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from openai.types.chat import ChatCompletion # type: ignore
+
+# 参与缓存键计算的请求参数（除 model/messages/tools 之外会影响输出的采样参数）
+_KEY_PARAMS = ('model', 'messages', 'tools', 'tool_choice', 'temperature', 'top_p', 'max_tokens',
+               'seed', 'stop', 'presence_penalty', 'frequency_penalty', 'n', 'response_format')
+
+CACHE_MODES = ('off', 'cache', 'record', 'replay')
+
+def request_key(request):
+    """
+    对请求参数做规范化JSON序列化后取SHA-256，作为精确匹配的缓存键。
+    """
+    payload = {k: request[k] for k in _KEY_PARAMS if request.get(k) is not None}
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class ResponseStore:
+    """
+    基于SQLite的本地响应存储，总大小超过上限时按最近访问时间淘汰。
+    """
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, response TEXT, size INTEGER, last_access REAL)")
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, response):
+        data = json.dumps(response, ensure_ascii=False)
+        size = len(data.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, data, size, time.time()))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                # 从最久未访问的条目开始淘汰，直到回到上限以内
+                freed = 0
+                victims = []
+                for victim_key, victim_size in self._conn.execute(
+                        "SELECT key, size FROM responses ORDER BY last_access ASC"):
+                    if total - freed <= self.max_bytes:
+                        break
+                    victims.append((victim_key,))
+                    freed += victim_size
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+            self._conn.commit()
+
+class Cassette:
+    """
+    录制/回放文件（JSONL），每行记录一次请求及其响应。
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def append(self, key, request, response):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        line = json.dumps({'key': key, 'request': request, 'response': response}, ensure_ascii=False, default=str)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+    def lookup(self, key):
+        with self._lock:
+            if self._entries is None:
+                self._entries = {}
+                if os.path.exists(self.path):
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        for line in f:
+                            if line.strip():
+                                entry = json.loads(line)
+                                self._entries[entry['key']] = entry['response']
+            return self._entries.get(key)
+
+class LLMResponseCache:
+    """
+    模型响应缓存，按模式工作：
+    - off:    不缓存
+    - cache:  读穿缓存，命中则直接返回，未命中时调用模型并写入本地存储
+    - record: 始终调用模型，并把请求与响应追加到录制文件
+    - replay: 只从录制文件回放，不访问网络；未录制的请求直接报错
+    """
+    def __init__(self, mode=None, store_path=None, cassette_path=None, max_bytes=None):
+        self.mode = (mode or os.getenv('LLM_CACHE_MODE', 'off')).lower()
+        if self.mode not in CACHE_MODES:
+            print(f"警告: 未知的 LLM_CACHE_MODE '{self.mode}'，已关闭响应缓存。")
+            self.mode = 'off'
+        self.store = None
+        self.cassette = None
+        if self.mode == 'cache':
+            store_path = store_path or os.getenv('LLM_CACHE_PATH', './.mymanus_cache/llm_cache.sqlite')
+            max_bytes = max_bytes if max_bytes is not None else int(float(os.getenv('LLM_CACHE_MAX_MB', '200')) * 1024 * 1024)
+            self.store = ResponseStore(store_path, max_bytes)
+        elif self.mode in ('record', 'replay'):
+            self.cassette = Cassette(cassette_path or os.getenv('LLM_CASSETTE', './.mymanus_cache/cassette.jsonl'))
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def create(self, client, **request):
+        """
+        代替 client.chat.completions.create 发起请求，返回 ChatCompletion 对象（包括重建的 tool_calls）。
+        """
+        if self.mode == 'off':
+            return client.chat.completions.create(**request)
+
+        key = request_key(request)
+        if self.mode == 'replay':
+            cached = self.cassette.lookup(key)
+            if cached is None:
+                self.misses += 1
+                raise LookupError(f"回放模式下未找到录制的响应（key={key[:12]}），请先以 record 模式录制该会话。")
+            self.hits += 1
+            return ChatCompletion.model_validate(cached)
+
+        if self.mode == 'cache':
+            cached = self.store.get(key)
+            if cached is not None:
+                self.hits += 1
+                return ChatCompletion.model_validate(cached)
+
+        self.misses += 1
+        response = client.chat.completions.create(**request)
+        data = response.model_dump(mode='json')
+        if self.mode == 'cache':
+            self.store.put(key, data)
+        else:
+            self.cassette.append(key, request, data)
+        return response
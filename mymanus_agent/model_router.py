@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import threading
+
+# 各调用阶段默认使用的模型档位
+#   clarify:      research_task 中的引导提问
+#   plan:         子问题拆解
+#   tool_routing: 工具调用循环中的中间轮次（选择调用哪个工具）
+#   synthesis:    面向用户的最终回答与研究报告
+DEFAULT_PHASE_TIERS = {
+    'clarify': 'fast',
+    'plan': 'fast',
+    'tool_routing': 'fast',
+    'synthesis': 'strong',
+}
+
+# 档位由快到慢排列，某一档调用失败时依次回退到更慢（更强）的档位
+TIER_ORDER = ('fast', 'strong')
+
+def estimate_tokens(messages):
+    """
+    粗略估算消息列表的token数（约每4个字符1个token），用于按提示词长度选择档位。
+    """
+    return len(json.dumps(messages, ensure_ascii=False, default=str)) // 4
+
+class ModelRouter:
+    """
+    按调用阶段、提示词长度与单个任务的token预算，把模型调用分配到不同档位，
+    失败时回退到更慢的档位，并记录各档位的延迟与token消耗。
+    未配置 MODEL_FAST 时只有一个档位，行为与直接使用 MODEL 相同。
+    """
+    def __init__(self, default_model, fast_model=None, strong_model=None,
+                 fast_max_prompt_tokens=None, task_token_budget=None):
+        strong_model = strong_model or os.getenv('MODEL_STRONG') or default_model
+        fast_model = fast_model or os.getenv('MODEL_FAST') or strong_model
+        self.tiers = {'fast': fast_model, 'strong': strong_model}
+        self.phase_tiers = dict(DEFAULT_PHASE_TIERS)
+        # 超过该长度的提示词直接交给强档位（快速模型通常上下文更短、长文本理解更弱）
+        self.fast_max_prompt_tokens = fast_max_prompt_tokens if fast_max_prompt_tokens is not None else \
+            int(os.getenv('ROUTER_FAST_MAX_PROMPT_TOKENS', '8000'))
+        # 单个任务（一轮对话或一次研究任务）的token预算，超出后所有调用降级到快速档位；0 表示不限制
+        self.task_token_budget = task_token_budget if task_token_budget is not None else \
+            int(os.getenv('ROUTER_TASK_TOKEN_BUDGET', '0'))
+        self.task_tokens = 0
+        self._lock = threading.Lock()
+        self._stats = {tier: {'model': model, 'calls': 0, 'failures': 0, 'latency_s': 0.0,
+                              'prompt_tokens': 0, 'completion_tokens': 0}
+                       for tier, model in self.tiers.items()}
+
+    @property
+    def multi_tier(self):
+        return self.tiers['fast'] != self.tiers['strong']
+
+    def begin_task(self):
+        """
+        开始一个新任务，重置任务内的token计数。
+        """
+        with self._lock:
+            self.task_tokens = 0
+
+    def budget_exhausted(self):
+        return bool(self.task_token_budget) and self.task_tokens >= self.task_token_budget
+
+    def select_tier(self, phase, messages):
+        """
+        根据阶段、提示词长度与任务预算选择档位。
+        """
+        if not self.multi_tier:
+            return 'strong'
+        tier = self.phase_tiers.get(phase, 'strong')
+        if tier == 'fast' and estimate_tokens(messages) > self.fast_max_prompt_tokens:
+            tier = 'strong'
+        if tier == 'strong' and self.budget_exhausted():
+            tier = 'fast'
+        return tier
+
+    def _record(self, tier, elapsed, response=None, messages=None, failed=False):
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            prompt_tokens = usage.prompt_tokens or 0
+            completion_tokens = usage.completion_tokens or 0
+        elif response is not None:
+            # 部分兼容服务不返回 usage，按字符数估算
+            prompt_tokens = estimate_tokens(messages or [])
+            content = response.choices[0].message.content if response.choices else ''
+            completion_tokens = len(content or '') // 4
+        else:
+            prompt_tokens = completion_tokens = 0
+        with self._lock:
+            stats = self._stats[tier]
+            stats['calls'] += 1
+            stats['latency_s'] += elapsed
+            if failed:
+                stats['failures'] += 1
+            stats['prompt_tokens'] += prompt_tokens
+            stats['completion_tokens'] += completion_tokens
+            self.task_tokens += prompt_tokens + completion_tokens
+
+    def complete(self, send, phase, request):
+        """
+        按路由结果发起调用。
+        :param send: 实际发起请求的函数，接收与 chat.completions.create 相同的关键字参数
+        :param phase: 调用阶段，见 DEFAULT_PHASE_TIERS
+        :param request: 请求参数，其中的 model 会被所选档位的模型覆盖
+        :return: (ChatCompletion, 实际使用的档位)
+        """
+        messages = request.get('messages', [])
+        tier = self.select_tier(phase, messages)
+        candidates = list(TIER_ORDER[TIER_ORDER.index(tier):])
+        last_error = None
+        for candidate in candidates:
+            model = self.tiers[candidate]
+            if last_error is not None and model == request.get('model'):
+                # 回退档位与失败档位是同一个模型，不必重试
+                continue
+            request = dict(request, model=model)
+            start = time.perf_counter()
+            try:
+                response = send(**request)
+            except Exception as e:
+                self._record(candidate, time.perf_counter() - start, failed=True)
+                if candidate != candidates[-1]:
+                    print(f"模型档位 {candidate}（{model}）调用失败，回退到更慢的档位: {e}")
+                last_error = e
+                continue
+            self._record(candidate, time.perf_counter() - start, response=response, messages=messages)
+            return response, candidate
+        raise last_error
+
+    def stats(self):
+        """
+        返回各档位的调用次数、失败次数、平均延迟与token消耗。
+        """
+        with self._lock:
+            report = {}
+            for tier, stats in self._stats.items():
+                report[tier] = dict(stats)
+                report[tier]['avg_latency_ms'] = round(stats['latency_s'] / stats['calls'] * 1000, 1) if stats['calls'] else 0.0
+                report[tier]['latency_s'] = round(stats['latency_s'], 3)
+            return report
+
+    def summary(self):
+        lines = []
+        for tier, stats in self.stats().items():
+            if stats['calls']:
+                lines.append(f"{tier}（{stats['model']}）：调用 {stats['calls']} 次，失败 {stats['failures']} 次，"
+                             f"平均延迟 {stats['avg_latency_ms']} ms，token {stats['prompt_tokens']}+{stats['completion_tokens']}")
+        return "\n".join(lines)
@@ -0,0 +1,309 @@
+import re
+import ast
+import json
+import threading
+
+# 本地修复的类别，键用于统计，值用于打印
+REPAIR_LABELS = {
+    'code_fence': '去除代码块标记',
+    'control_chars': '字符串中未转义的换行/制表符',
+    'invalid_escape': '非法的反斜杠转义',
+    'trailing_comma': '多余的结尾逗号',
+    'extra_text': 'JSON前后的多余文本',
+    'python_literal': 'Python字面量写法',
+    'raw_value': '代码块形式的参数值',
+    'dropped_keys': '删除未定义的参数',
+    'renamed_key': '参数名纠正',
+    'coerced_type': '参数类型转换',
+    'null_dropped': '删除取值为null的可选参数',
+}
+
+_FENCE_RE = re.compile(r'^\s*```[A-Za-z0-9_-]*[ \t]*\n?(.*?)\n?[ \t]*```\s*$', re.S)
+# 合法的转义整体匹配（避免把 \\d 中的第二个反斜杠误判为非法转义），其余的单个反斜杠补为 \\
+_ESCAPE_RE = re.compile(r'\\(["\\/bfnrtu])|\\')
+_TRUE_STRINGS = {'true', '1', 'yes', 'y', '是'}
+_FALSE_STRINGS = {'false', '0', 'no', 'n', '否'}
+
+def _strip_code_fence(text):
+    match = _FENCE_RE.match(text)
+    return match.group(1) if match else text
+
+def _strip_trailing_commas(text):
+    """
+    删除 } 或 ] 之前多余的逗号，字符串内部的内容保持不变。
+    """
+    out = []
+    in_string = False
+    escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '}]':
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ',':
+                del out[j]
+        out.append(ch)
+    return ''.join(out)
+
+def _similar_keys(a, b):
+    a, b = a.lower(), b.lower()
+    return a == b or (min(len(a), len(b)) >= 3 and (a in b or b in a))
+
+def _loads(text, strict=True):
+    try:
+        return json.loads(text, strict=strict), True
+    except ValueError:
+        return None, False
+
+def _describe(value):
+    text = json.dumps(value, ensure_ascii=False, default=str)
+    return text if len(text) <= 60 else text[:57] + '...'
+
+def _coerce(value, prop):
+    """
+    按参数schema转换取值类型。
+    :return: (转换后的值, 是否发生了转换)；无法转换时抛出 ValueError
+    """
+    expected = prop.get('type')
+    coerced = value
+    if expected == 'string' and not isinstance(value, str):
+        if isinstance(value, list) and all(isinstance(v, str) for v in value):
+            # 模型有时把多行代码写成按行拆分的数组
+            coerced = '\n'.join(value)
+        elif isinstance(value, bool):
+            coerced = 'true' if value else 'false'
+        elif isinstance(value, (int, float)):
+            coerced = str(value)
+        else:
+            raise ValueError(f"应为 string 类型，实际为 {_describe(value)}")
+    elif expected == 'integer' and (isinstance(value, bool) or not isinstance(value, int)):
+        if isinstance(value, float) and value.is_integer():
+            coerced = int(value)
+        elif isinstance(value, str) and re.fullmatch(r'\s*[-+]?\d+(\.0*)?\s*', value):
+            coerced = int(float(value))
+        else:
+            raise ValueError(f"应为 integer 类型，实际为 {_describe(value)}")
+    elif expected == 'number' and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        try:
+            coerced = float(value) if isinstance(value, str) else None
+        except ValueError:
+            coerced = None
+        if coerced is None:
+            raise ValueError(f"应为 number 类型，实际为 {_describe(value)}")
+    elif expected == 'boolean' and not isinstance(value, bool):
+        text = str(value).strip().lower() if isinstance(value, (str, int)) else None
+        if text in _TRUE_STRINGS:
+            coerced = True
+        elif text in _FALSE_STRINGS:
+            coerced = False
+        else:
+            raise ValueError(f"应为 boolean 类型，实际为 {_describe(value)}")
+    elif expected == 'array' and not isinstance(value, list):
+        parsed, ok = _loads(value) if isinstance(value, str) else (None, False)
+        coerced = parsed if ok and isinstance(parsed, list) else [value]
+    elif expected == 'object' and not isinstance(value, dict):
+        parsed, ok = _loads(value) if isinstance(value, str) else (None, False)
+        if not (ok and isinstance(parsed, dict)):
+            raise ValueError(f"应为 object 类型，实际为 {_describe(value)}")
+        coerced = parsed
+
+    enum = prop.get('enum')
+    if enum and coerced not in enum:
+        matches = [option for option in enum if isinstance(coerced, str) and str(option).lower() == coerced.strip().lower()]
+        if not matches:
+            raise ValueError(f"取值应为 {', '.join(map(str, enum))} 之一，实际为 {_describe(coerced)}")
+        coerced = matches[0]
+    return coerced, coerced is not value
+
+class ToolArgumentValidator:
+    """
+    按工具定义中的JSON Schema解析并校验模型给出的工具参数。
+    常见的格式问题（代码块标记、结尾逗号、py_code 中未转义的换行等）、参数类型与参数名偏差在本地修复，
+    无法修复时返回指明问题所在的错误信息，避免为一处格式错误多花一轮模型调用。
+    """
+    def __init__(self, tools_definitions):
+        self.schemas = {}
+        for tool in tools_definitions or []:
+            function = tool.get('function', {})
+            if function.get('name'):
+                self.schemas[function['name']] = function.get('parameters') or {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.repaired = 0
+        self.rejected = 0
+        self.repair_counts = {}
+
+    def parse(self, name, arguments):
+        """
+        解析并校验一次工具调用的参数。
+        :param name: 工具名
+        :param arguments: 模型给出的参数字符串
+        :return: (参数字典, 错误信息, 修复类别列表)；无法修复时参数字典为 None
+        """
+        schema = self.schemas.get(name)
+        text = (arguments or '').strip()
+        repairs = []
+        error = None
+        args = None
+        if not text:
+            args = {}
+        else:
+            args, json_error = self._parse_json(text, schema, repairs)
+            if args is None:
+                preview = text if len(text) <= 500 else text[:500] + '...'
+                error = (f"错误：工具 '{name}' 的参数不是有效的JSON对象（{json_error}），且无法自动修复。"
+                         f"请输入符合JSON格式的参数。原始参数：{preview}")
+        if args is not None and schema is not None:
+            args, problems = self._validate(args, schema, repairs)
+            if problems:
+                args = None
+                error = (f"错误：工具 '{name}' 的参数未通过校验：{'；'.join(problems)}。"
+                         f"参数说明：{self._signature(schema)}。请修正后重新调用。")
+
+        repairs = [] if error else list(dict.fromkeys(repairs))
+        with self._lock:
+            self.calls += 1
+            if error:
+                self.rejected += 1
+            elif repairs:
+                self.repaired += 1
+            for kind in repairs:
+                self.repair_counts[kind] = self.repair_counts.get(kind, 0) + 1
+        return args, error, repairs
+
+    def _parse_json(self, text, schema, repairs):
+        """
+        依次尝试各项修复，直到解析出JSON对象。
+        :return: (参数字典或 None, 原始的JSON解析错误说明)
+        """
+        try:
+            value = json.loads(text)
+            return (value, None) if isinstance(value, dict) else (None, f"解析结果为 {type(value).__name__}，而不是对象")
+        except json.JSONDecodeError as e:
+            json_error = f"第{e.lineno}行第{e.colno}列：{e.msg}"
+
+        candidate = _strip_code_fence(text)
+        if candidate != text:
+            repairs.append('code_fence')
+            value, ok = _loads(candidate)
+            if ok and isinstance(value, dict):
+                return value, None
+        # 各步骤的结果依次叠加；统一以 strict=False 解析，允许字符串中出现未转义的换行与制表符
+        steps = [
+            (None, lambda t: t),
+            ('invalid_escape', lambda t: _ESCAPE_RE.sub(lambda m: m.group(0) if m.group(1) else '\\\\', t)),
+            ('trailing_comma', _strip_trailing_commas),
+        ]
+        for kind, transform in steps:
+            transformed = transform(candidate)
+            if kind is not None:
+                if transformed == candidate:
+                    continue
+                repairs.append(kind)
+            candidate = transformed
+            value, ok = _loads(candidate, strict=False)
+            if ok and isinstance(value, dict):
+                if not _loads(candidate)[1]:
+                    repairs.append('control_chars')
+                return value, None
+
+        start = candidate.find('{')
+        if start >= 0:
+            try:
+                value, _ = json.JSONDecoder(strict=False).raw_decode(candidate, start)
+                if isinstance(value, dict):
+                    repairs.append('extra_text')
+                    return value, None
+            except ValueError:
+                pass
+        try:
+            value = ast.literal_eval(candidate)
+            if isinstance(value, dict):
+                repairs.append('python_literal')
+                return value, None
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            pass
+
+        # 只有一个必填字符串参数的工具（如 python_inter），模型有时直接给出用代码块包裹的参数值本身；
+        # 未用代码块包裹的文本无法确定是否为完整的参数值，按校验错误返回
+        del repairs[:]
+        fence = _FENCE_RE.match(text)
+        required = (schema or {}).get('required') or []
+        properties = (schema or {}).get('properties') or {}
+        if fence and not fence.group(1).lstrip().startswith(('{', '[')) and len(required) == 1 \
+                and properties.get(required[0], {}).get('type') == 'string':
+            repairs.append('raw_value')
+            return {required[0]: fence.group(1)}, None
+        return None, json_error
+
+    def _validate(self, args, schema, repairs):
+        """
+        :return: (修复后的参数字典, 无法修复的问题列表)
+        """
+        properties = schema.get('properties') or {}
+        required = schema.get('required') or []
+        args = dict(args)
+        problems = []
+
+        extra = [key for key in args if key not in properties]
+        for key in list(extra):
+            # 参数名与某个缺失参数互为子串（如 code/py_code、query/sql_query）时视为同一参数
+            missing = [p for p in properties if p not in args and _similar_keys(key, p)]
+            if len(missing) == 1:
+                args[missing[0]] = args.pop(key)
+                extra.remove(key)
+                repairs.append('renamed_key')
+        if extra:
+            for key in extra:
+                del args[key]
+            repairs.append('dropped_keys')
+
+        for key in list(args):
+            if args[key] is None:
+                if key in required:
+                    problems.append(f"必填参数 '{key}' 不能为 null")
+                else:
+                    del args[key]
+                    repairs.append('null_dropped')
+                continue
+            try:
+                args[key], changed = _coerce(args[key], properties[key])
+            except ValueError as e:
+                problems.append(f"参数 '{key}' {e}")
+                continue
+            if changed:
+                repairs.append('coerced_type')
+
+        for key in required:
+            if key not in args:
+                problems.append(f"缺少必填参数 '{key}'（{properties.get(key, {}).get('type', 'any')}）")
+        return args, problems
+
+    @staticmethod
+    def _signature(schema):
+        required = schema.get('required') or []
+        parts = [f"{key}（{prop.get('type', 'any')}{'，必填' if key in required else '，可选'}）"
+                 for key, prop in (schema.get('properties') or {}).items()]
+        return ', '.join(parts) or '无参数'
+
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'repaired': self.repaired, 'rejected': self.rejected,
+                    'repairs': dict(self.repair_counts)}
+
+    def summary(self):
+        stats = self.stats()
+        if not stats['repaired'] and not stats['rejected']:
+            return ""
+        details = ', '.join(f"{REPAIR_LABELS.get(kind, kind)} {count}" for kind, count in stats['repairs'].items())
+        return (f"工具参数：共 {stats['calls']} 次调用，本地修复 {stats['repaired']} 次，拒绝 {stats['rejected']} 次"
+                + (f"（{details}）" if details else ""))
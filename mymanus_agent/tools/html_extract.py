@@ -0,0 +1,290 @@
+import os
+import threading
+from lxml import etree # type: ignore
+
+# 各站点的抽取规则。XPath 在模块加载时编译一次，避免每次调用重新解析表达式。
+# stream_markers: 流式解析时用来识别正文容器的 class 名称（按 token 精确匹配）
+# stream_max_blocks: 流式解析时收集到多少个正文容器后即停止解析，None 表示解析到页面结束；
+#                    只有正文只有一个容器的页面（如专栏文章）才能提前停止，否则与 DOM 路径的结果不一致
+SITE_RULES = {
+    'zhuanlan': {
+        'authority': 'zhuanlan.zhihu.com',
+        'title': [etree.XPath('//div[1]/div/main/div/article/header/h1/text()')],
+        'text': [etree.XPath('//div/main/div/article/div[1]/div/div/div/p/text()')],
+        'code': [etree.XPath('//div/main/div/article/div[1]/div/div/div//pre/code/text()')],
+        'stream_markers': {'RichText'},
+        'stream_max_blocks': 1,
+    },
+    'zhihu_answer': {
+        'authority': 'www.zhihu.com',
+        'title': [etree.XPath('//div/div[1]/div/h1/text()')],
+        'text': [
+            etree.XPath('//div[contains(@class, "AnswerItem")]//div[contains(@class, "RichContent-inner")]//span[contains(@class, "RichText")]//p/text()'),
+            etree.XPath('//div[1]/div/div[3]/div/div/div/div[2]/span[1]/div/div/span/p/text()'),
+        ],
+        'code': [],
+        'stream_markers': {'RichText'},
+        # 回答页下方还会列出其他回答，DOM 路径会抽取全部回答，流式解析同样需要解析到页面结束
+        'stream_max_blocks': None,
+    },
+    'zhihu_question': {
+        'authority': 'www.zhihu.com',
+        'title': [etree.XPath('//div/div[1]/div/h1/text()')],
+        'text': [etree.XPath('//div/div/div/div[2]/div/div[2]/div/div/div[2]/span[1]/div/div/span/p/text()')],
+        'code': [],
+        'stream_markers': {'RichText'},
+        'stream_max_blocks': None,
+    },
+}
+
+# 通用抽取器使用的表达式
+_XP_H1_TEXT = etree.XPath('//h1//text()')
+_XP_TITLE_TEXT = etree.XPath('//title/text()')
+_XP_PARAGRAPHS = etree.XPath('//p')
+_XP_LINK_TEXT = etree.XPath('.//a//text()')
+_XP_ALL_TEXT = etree.XPath('string()')
+_XP_PRE_CODE = etree.XPath('.//pre//code')
+
+_NOISE_TAGS = ('script', 'style', 'noscript', 'iframe', 'svg', 'nav', 'footer', 'header', 'form')
+_parser_local = threading.local()
+
+def match_site_rule(url):
+    """
+    根据URL判断使用哪一条站点抽取规则，未匹配时返回None。
+    """
+    if 'zhihu.com/question' in url:
+        return 'zhihu_answer' if 'answer' in url else 'zhihu_question'
+    if 'zhuanlan.zhihu.com' in url:
+        return 'zhuanlan'
+    return None
+
+def _clean_text(s):
+    return ' '.join(str(s).split())
+
+def _html_parser(encoding):
+    # lxml 解析器不能跨线程共享，这里按线程、按编码缓存复用
+    parsers = getattr(_parser_local, 'parsers', None)
+    if parsers is None:
+        parsers = _parser_local.parsers = {}
+    if encoding not in parsers:
+        parsers[encoding] = etree.HTMLParser(encoding=encoding)
+    return parsers[encoding]
+
+def _direct_text(elem):
+    # 等价于 XPath 的 elem/text()：元素自身文本加上各子元素的 tail
+    parts = [elem.text] if elem.text else []
+    for child in elem:
+        if child.tail:
+            parts.append(child.tail)
+    return parts
+
+def _first_xpath_hit(xpaths, root):
+    for xp in xpaths:
+        hits = xp(root)
+        if hits:
+            return hits
+    return []
+
+def extract_from_tree(root, rule_name):
+    """
+    使用预编译的站点XPath从已构建的DOM中抽取标题、正文段落和代码块。
+    :param root: lxml 元素树的根节点
+    :param rule_name: SITE_RULES 中的规则名称
+    :return: dict，包含 title、paragraphs、code 三个字段
+    """
+    rule = SITE_RULES[rule_name]
+    title_hits = _first_xpath_hit(rule['title'], root)
+    paragraphs = [t for t in (_clean_text(x) for x in _first_xpath_hit(rule['text'], root)) if t]
+    code = [str(c).strip() for c in _first_xpath_hit(rule['code'], root) if str(c).strip()]
+    return {
+        'title': _clean_text(title_hits[0]) if title_hits else None,
+        'paragraphs': paragraphs,
+        'code': code,
+    }
+
+def _link_density(elem):
+    text_len = len(_clean_text(_XP_ALL_TEXT(elem))) or 1
+    link_len = sum(len(_clean_text(t)) for t in _XP_LINK_TEXT(elem))
+    return min(link_len / text_len, 1.0)
+
+def readability_extract(root, min_paragraph_len=25):
+    """
+    通用的正文抽取器（readability 风格），在站点XPath没有命中时使用。
+    按段落长度和标点密度给父节点打分，扣除链接密度后取得分最高的容器作为正文。
+    :param root: lxml 元素树的根节点（会被就地移除脚本、样式等噪声节点）
+    :param min_paragraph_len: 参与打分的最短段落长度
+    :return: dict，包含 title、paragraphs、code 三个字段
+    """
+    etree.strip_elements(root, *_NOISE_TAGS, with_tail=False)
+
+    title_hits = _XP_H1_TEXT(root) or _XP_TITLE_TEXT(root)
+    title = _clean_text(title_hits[0]) if title_hits else None
+
+    scores = {}
+    for p in _XP_PARAGRAPHS(root):
+        text = _clean_text(_XP_ALL_TEXT(p))
+        if len(text) < min_paragraph_len:
+            continue
+        score = 1 + text.count(',') + text.count('，') + text.count('。') + min(len(text) // 100, 3)
+        parent = p.getparent()
+        if parent is None:
+            continue
+        scores[parent] = scores.get(parent, 0) + score
+        grand_parent = parent.getparent()
+        if grand_parent is not None:
+            scores[grand_parent] = scores.get(grand_parent, 0) + score / 2
+
+    if not scores:
+        return {'title': title, 'paragraphs': [], 'code': []}
+
+    best = max(scores, key=lambda el: scores[el] * (1 - _link_density(el)))
+    paragraphs = [t for t in (_clean_text(_XP_ALL_TEXT(p)) for p in best.iter('p')) if t]
+    code = [t for t in (_XP_ALL_TEXT(c).strip() for c in _XP_PRE_CODE(best)) if t]
+    return {'title': title, 'paragraphs': paragraphs, 'code': code}
+
+def extract_streaming(chunks, rule_name, encoding='utf-8'):
+    """
+    增量解析HTML：边接收数据边抽取，收集到目标正文容器后立即停止，不构建整棵DOM。
+    :param chunks: 可迭代的 bytes 数据块（例如 response.iter_content()）
+    :param rule_name: SITE_RULES 中的规则名称
+    :param encoding: 页面编码
+    :return: dict，包含 title、paragraphs、code 三个字段
+    """
+    rule = SITE_RULES[rule_name]
+    markers = rule['stream_markers']
+    max_blocks = rule['stream_max_blocks']
+
+    parser = etree.HTMLPullParser(events=('end',), encoding=encoding)
+    closed_blocks = 0
+    title = None
+    fallback_title = None
+    paragraphs = []
+    code = []
+    # 这些元素的直接文本依赖子元素的 tail，子元素结束时不能删除
+    keep_children = ('p', 'code', 'h1', 'title', 'pre')
+
+    def _is_container(el):
+        cls = el.get('class')
+        return bool(cls) and not markers.isdisjoint(cls.split())
+
+    def _inside_container(el):
+        # 未结束的祖先节点不会被释放，可以直接沿父链向上查找
+        parent = el.getparent()
+        while parent is not None:
+            if _is_container(parent):
+                return True
+            parent = parent.getparent()
+        return False
+
+    done = False
+    for chunk in chunks:
+        if not chunk:
+            continue
+        parser.feed(chunk)
+        for _, elem in parser.read_events():
+            tag = elem.tag
+            if tag == 'p':
+                if _inside_container(elem):
+                    text = _clean_text(''.join(_direct_text(elem)))
+                    if text:
+                        paragraphs.append(text)
+            elif tag == 'code':
+                parent = elem.getparent()
+                if parent is not None and parent.tag == 'pre' and _inside_container(elem):
+                    text = ''.join(_direct_text(elem)).strip()
+                    if text:
+                        code.append(text)
+            elif tag == 'h1':
+                if title is None:
+                    title = _clean_text(''.join(_direct_text(elem))) or None
+            elif tag == 'title':
+                if fallback_title is None:
+                    fallback_title = _clean_text(elem.text or '') or None
+            elif _is_container(elem) and not _inside_container(elem):
+                closed_blocks += 1
+
+            # 释放已处理完的节点，保持内存占用与页面大小无关
+            parent = elem.getparent()
+            if parent is not None and parent.tag not in keep_children:
+                elem.clear(keep_tail=True)
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+            if max_blocks is not None and closed_blocks >= max_blocks:
+                done = True
+                break
+        if done:
+            break
+
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        pass
+    # 提前停止时解析器中还留有未读取的事件，它们与解析器互相引用，会让已解析的节点一直存活到下一次循环GC，
+    # 这里读空事件队列，使节点随函数返回立即释放
+    for _ in parser.read_events():
+        pass
+
+    return {
+        'title': title or fallback_title,
+        'paragraphs': paragraphs,
+        'code': code,
+    }
+
+def extract_page(chunks, url, encoding='utf-8', stream=None):
+    """
+    页面抽取入口：对完整页面依次尝试站点XPath和通用抽取器。
+    开启流式解析时先走流式解析，未抽取到正文再构建完整DOM。
+    :param chunks: 可迭代的 bytes 数据块
+    :param url: 页面地址，用于匹配站点规则
+    :param encoding: 页面编码
+    :param stream: 是否先尝试流式解析，为None时读取环境变量 HTML_EXTRACT_STREAM（默认关闭：
+                   在 benchmarks/bench_html_extract.py 的样例页面上，完整DOM在吞吐和内存上都优于流式解析）
+    :return: dict，包含 title、paragraphs、code、method 四个字段
+    """
+    if stream is None:
+        stream = os.getenv('HTML_EXTRACT_STREAM', '0') == '1'
+    rule_name = match_site_rule(url)
+    received = bytearray()
+
+    def _recording(source):
+        for chunk in source:
+            received.extend(chunk)
+            yield chunk
+
+    chunk_iter = iter(chunks)
+    if stream and rule_name is not None:
+        page = extract_streaming(_recording(chunk_iter), rule_name, encoding=encoding)
+        if page['title'] and page['paragraphs']:
+            page['method'] = 'stream'
+            return page
+
+    # 补齐剩余数据并构建完整DOM
+    for chunk in chunk_iter:
+        received.extend(chunk)
+    raw = bytes(received)
+    del received[:]
+    if not raw.strip():
+        return {'title': None, 'paragraphs': [], 'code': [], 'method': 'empty'}
+    root = etree.HTML(raw, parser=_html_parser(encoding))
+    if root is None:
+        return {'title': None, 'paragraphs': [], 'code': [], 'method': 'empty'}
+
+    if rule_name is not None:
+        page = extract_from_tree(root, rule_name)
+        if page['title'] and page['paragraphs']:
+            page['method'] = 'xpath'
+            return page
+
+    page = readability_extract(root)
+    page['method'] = 'fallback'
+    return page
+
+def page_to_text(page):
+    """
+    将抽取结果拼接为正文文本，代码块以Markdown代码围栏附在末尾。
+    """
+    parts = [' '.join(page['paragraphs'])]
+    for c_item in page['code']:
+        parts.append("\n```\n" + c_item.replace('\n', ' ').strip() + "\n```\n")
+    return ''.join(parts).strip()
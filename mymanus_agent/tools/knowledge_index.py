@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+
+# 汉字连续片段按二元组切分，英文与数字按单词切分，再交给 FTS5 的 unicode61 分词器按空格建立倒排索引
+_TOKEN_RE = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]+|[A-Za-z0-9_]+')
+
+def tokenize(text):
+    """
+    将文本切分为检索词：汉字片段切为重叠的二元组（单字保留为一元），英文单词转为小写。
+    """
+    tokens = []
+    for run in _TOKEN_RE.findall(text or ''):
+        if run.isascii():
+            tokens.append(run.lower())
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def _read_archive_file(path):
+    """
+    读取归档文件，返回 (标题, 正文, token数)。
+    auto_search 下的JSON文件以所在的查询目录名补充标题，research_task 下的Markdown报告以文件名为标题。
+    """
+    if path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        entry = data[0] if isinstance(data, list) and data else data
+        if not isinstance(entry, dict):
+            return None
+        query_dir = os.path.basename(os.path.dirname(path))
+        title = f"{entry.get('title', '')} {query_dir}".strip()
+        content = entry.get('content', '')
+        return title, content, entry.get('tokens') or len(content) // 2
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    title = os.path.basename(path)[:-len('.md')].rstrip('.')
+    return title, content, len(content) // 2
+
+class KnowledgeIndex:
+    """
+    对 ./auto_search/**/*.json 与 ./research_task/*.md 建立的本地全文索引（SQLite FTS5，BM25排序）。
+    每次检索前按文件的修改时间与大小增量同步：只重新索引新增或变化的文件，并删除已不存在的文件。
+    """
+    def __init__(self, db_path=None, search_dir=None, report_dir=None):
+        self.db_path = db_path or os.getenv('KNOWLEDGE_INDEX_PATH', './.mymanus_cache/knowledge_index.sqlite')
+        self.search_dir = search_dir or './auto_search'
+        self.report_dir = report_dir or './research_task'
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, path TEXT UNIQUE, source TEXT, "
+                "title TEXT, content TEXT, tokens INTEGER, mtime REAL, size INTEGER);"
+                "CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(title, body, tokenize='unicode61');")
+        return self._conn
+
+    def _archive_files(self):
+        for root_dir, source, suffix in ((self.search_dir, 'auto_search', '.json'),
+                                         (self.report_dir, 'research_task', '.md')):
+            if not os.path.isdir(root_dir):
+                continue
+            for dir_path, _, file_names in os.walk(root_dir):
+                for file_name in file_names:
+                    if file_name.endswith(suffix):
+                        yield os.path.join(dir_path, file_name), source
+
+    def refresh(self):
+        """
+        增量同步索引。
+        :return: (新增或更新的文件数, 删除的文件数)
+        """
+        with self._lock:
+            conn = self._connect()
+            known = {path: (doc_id, mtime, size) for doc_id, path, mtime, size
+                     in conn.execute("SELECT id, path, mtime, size FROM docs")}
+            updated = 0
+            seen = set()
+            for path, source in self._archive_files():
+                seen.add(path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                previous = known.get(path)
+                if previous and previous[1] == stat.st_mtime and previous[2] == stat.st_size:
+                    continue
+                try:
+                    parsed = _read_archive_file(path)
+                except (OSError, ValueError) as e:
+                    print(f"索引文件 {path} 失败: {e}")
+                    continue
+                if parsed is None:
+                    continue
+                title, content, tokens = parsed
+                if previous:
+                    conn.execute("DELETE FROM docs_fts WHERE rowid = ?", (previous[0],))
+                    conn.execute("DELETE FROM docs WHERE id = ?", (previous[0],))
+                cursor = conn.execute(
+                    "INSERT INTO docs (path, source, title, content, tokens, mtime, size) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, source, title, content, tokens, stat.st_mtime, stat.st_size))
+                conn.execute("INSERT INTO docs_fts (rowid, title, body) VALUES (?, ?, ?)",
+                             (cursor.lastrowid, ' '.join(tokenize(title)), ' '.join(tokenize(content))))
+                updated += 1
+            removed = [(doc_id,) for path, (doc_id, _, _) in known.items() if path not in seen]
+            conn.executemany("DELETE FROM docs_fts WHERE rowid = ?", removed)
+            conn.executemany("DELETE FROM docs WHERE id = ?", removed)
+            conn.commit()
+            return updated, len(removed)
+
+    def search(self, query, limit=5):
+        """
+        检索与问题相关的归档文档，按BM25相关度排序（标题权重更高）。
+        :return: 字典列表，包含 title、path、source、content、tokens、score
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        self.refresh()
+        match = ' OR '.join('"%s"' % term for term in terms)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT d.title, d.path, d.source, d.content, d.tokens, bm25(docs_fts, 3.0, 1.0) AS score "
+                "FROM docs_fts JOIN docs d ON d.id = docs_fts.rowid "
+                "WHERE docs_fts MATCH ? ORDER BY score LIMIT ?", (match, limit)).fetchall()
+        return [{'title': title, 'path': path, 'source': source, 'content': content,
+                 'tokens': tokens, 'score': -score} for title, path, source, content, tokens, score in rows]
+
+    @staticmethod
+    def coverage(query, docs):
+        """
+        计算检索词被命中文档覆盖的比例（0~1）。
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return 0.0
+        covered = set()
+        for doc in docs:
+            covered |= terms & set(tokenize(doc['title'] + ' ' + doc['content']))
+        return len(covered) / len(terms)
+
+KNOWLEDGE_INDEX = KnowledgeIndex()
+
+def _format_docs(docs, max_tokens):
+    content_accumulator = ''
+    num_tokens = 0
+    for doc in docs:
+        if num_tokens + doc['tokens'] > max_tokens:
+            break
+        content_accumulator += f"--- 本地资料: {doc['title']}（{doc['path']}）---\n{doc['content']}\n\n"
+        num_tokens += doc['tokens']
+    return content_accumulator.strip()
+
+def search_local_knowledge(q, g_namespace=None):
+    """
+    在本地知识库（以往联网搜索保存的页面、README与研究报告）中检索与问题相关的内容。
+    """
+    print('正在检索本地知识库...')
+    try:
+        docs = KNOWLEDGE_INDEX.search(q, limit=int(os.getenv('KNOWLEDGE_TOP_K', '5')))
+    except sqlite3.Error as e:
+        return f"本地知识库检索失败: {e}"
+    if not docs:
+        return "本地知识库中未找到相关内容。"
+    content = _format_docs(docs, int(os.getenv('KNOWLEDGE_MAX_TOKENS', '12000')))
+    return content or "本地知识库中相关内容过长，请改用联网搜索。"
+
+def local_answer(q):
+    """
+    本地知识库对问题的覆盖足够时返回检索内容，否则返回 None。
+    覆盖足够指：命中文档数不少于 KNOWLEDGE_MIN_DOCS，且检索词覆盖率不低于 KNOWLEDGE_MIN_COVERAGE。
+    """
+    if os.getenv('KNOWLEDGE_LOCAL_FIRST', '1') != '1':
+        return None
+    try:
+        docs = KNOWLEDGE_INDEX.search(q, limit=int(os.getenv('KNOWLEDGE_TOP_K', '5')))
+    except sqlite3.Error as e:
+        print(f"本地知识库检索失败: {e}")
+        return None
+    if len(docs) < int(os.getenv('KNOWLEDGE_MIN_DOCS', '2')):
+        return None
+    if KnowledgeIndex.coverage(q, docs) < float(os.getenv('KNOWLEDGE_MIN_COVERAGE', '0.8')):
+        return None
+    return _format_docs(docs, int(os.getenv('KNOWLEDGE_MAX_TOKENS', '12000'))) or None
@@ -0,0 +1,331 @@
+import os
+import re
+import sys
+import mmap
+import uuid
+import pickle
+import types
+import shutil
+import itertools
+import threading
+import numpy as np # type: ignore
+import pandas as pd # type: ignore
+from .shared_data import write_segment, attach
+from .query_cache import QUERY_CACHE
+
+_IDENTIFIER_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+# 数据保存在内存中的文件系统类型：映射这类文件（如共享数据平面在 /dev/shm 中的数据段）不会减少内存占用
+_MEMORY_FS_TYPES = {'tmpfs', 'ramfs', 'hugetlbfs'}
+_mount_points = None
+
+def _is_memory_fs(path):
+    """
+    文件是否位于基于内存的文件系统上（按 /proc/mounts 中最长匹配的挂载点判断，无法判断的平台返回 False）。
+    """
+    global _mount_points
+    if _mount_points is None:
+        mounts = []
+        try:
+            with open('/proc/mounts', 'r', encoding='utf-8') as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) >= 3:
+                        mounts.append((fields[1].replace('\\040', ' '), fields[2]))
+        except OSError:
+            pass
+        # 挂载点由长到短排列，第一个匹配的即为文件所在的文件系统
+        _mount_points = sorted(mounts, key=lambda mount: len(mount[0]), reverse=True)
+    path = os.path.realpath(path)
+    for mount_point, fs_type in _mount_points:
+        if path == mount_point or path.startswith(mount_point.rstrip('/') + '/'):
+            return fs_type in _MEMORY_FS_TYPES
+    return False
+
+def _is_file_backed(values):
+    # 沿 base 链查找内存映射：映射磁盘文件的数据由操作系统按需换入换出，不计入常驻内存；
+    # 映射 tmpfs（/dev/shm）中文件的数据始终占用内存，按实际大小计入
+    while values is not None:
+        if isinstance(values, np.memmap):
+            return not (values.filename and _is_memory_fs(values.filename))
+        if isinstance(values, mmap.mmap):
+            return True
+        values = getattr(values, 'base', None)
+    return False
+
+def deep_sizeof(obj):
+    """
+    估算变量占用的常驻内存（字节）：DataFrame/Series 按 deep=True 统计（含字符串等对象列），
+    NumPy 数组按 nbytes 统计，映射磁盘文件的部分不计入（映射 /dev/shm 等内存文件系统的仍计入）；
+    其他对象使用 sys.getsizeof。
+    """
+    if isinstance(obj, pd.DataFrame):
+        usage = obj.memory_usage(deep=True, index=True)
+        total = int(usage.sum())
+        for i in range(obj.shape[1]):
+            series = obj.iloc[:, i]
+            if isinstance(series.dtype, np.dtype) and _is_file_backed(series.to_numpy()):
+                total -= int(usage.iloc[i + 1])
+        return total
+    if isinstance(obj, pd.Series):
+        if isinstance(obj.dtype, np.dtype) and _is_file_backed(obj.to_numpy()):
+            return int(obj.index.memory_usage(deep=True))
+        return int(obj.memory_usage(deep=True, index=True))
+    if isinstance(obj, np.ndarray):
+        return 0 if _is_file_backed(obj) else int(obj.nbytes)
+    try:
+        return sys.getsizeof(obj)
+    except TypeError:
+        return 0
+
+def _code_names(code):
+    # 函数体及其中嵌套的函数、推导式、lambda 引用的全局变量名
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _code_names(const)
+    return names
+
+def global_names(value):
+    """
+    函数（或类中定义的方法）执行时可能读取的全局变量名。
+    """
+    if isinstance(value, types.MethodType):
+        value = value.__func__
+    if isinstance(value, types.FunctionType):
+        return _code_names(value.__code__)
+    if isinstance(value, type):
+        names = set()
+        for attr in vars(value).values():
+            if isinstance(attr, (staticmethod, classmethod)):
+                attr = attr.__func__
+            if isinstance(attr, types.FunctionType):
+                names |= _code_names(attr.__code__)
+        return names
+    return set()
+
+# 命名空间中记录“只存在于执行进程中的函数/类 -> 其读取的全局变量名”的键（见 python_tools.run_python_in_worker）
+REMOTE_GLOBALS_KEY = '__mymanus_remote_globals__'
+
+def referenced_names(code, namespace):
+    """
+    代码可能读写的变量名：代码中出现的变量名，加上其中引用的函数、类会读取的全局变量名（逐层展开）。
+    """
+    remote = namespace.get(REMOTE_GLOBALS_KEY) or {}
+    pending = set(_IDENTIFIER_RE.findall(code or ''))
+    seen = set()
+    while pending:
+        name = pending.pop()
+        seen.add(name)
+        if name in namespace:
+            pending |= global_names(namespace[name]) - seen
+        elif name in remote:
+            pending |= set(remote[name]) - seen
+    return seen
+
+class SpillStore:
+    """
+    落盘数据的存储目录。DataFrame 与 NumPy 数组复用共享数据平面的数据段格式（数值列可内存映射加载），
+    Series 使用 pickle。每份落盘数据带引用计数，命名空间的副本共享同一份文件，计数归零时删除。
+    """
+    def __init__(self, root_dir=None):
+        base = root_dir or os.getenv('NAMESPACE_SPILL_DIR', './.mymanus_cache/spill')
+        self.root_dir = os.path.join(base, f"ns_{os.getpid()}_{uuid.uuid4().hex[:8]}")
+        self._refcounts = {}
+        self._lock = threading.Lock()
+
+    def write(self, obj):
+        """
+        写入一个对象，返回引用描述；不支持的对象返回 None。
+        """
+        os.makedirs(self.root_dir, exist_ok=True)
+        if isinstance(obj, pd.Series):
+            seg_dir = os.path.join(self.root_dir, uuid.uuid4().hex)
+            os.makedirs(seg_dir)
+            with open(os.path.join(seg_dir, 'series.pkl'), 'wb') as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            ref = {'kind': 'series', 'dir': seg_dir, 'file': 'series.pkl'}
+        else:
+            ref = write_segment(obj, self.root_dir)
+            if ref is None:
+                return None
+        ref['disk_bytes'] = sum(entry.stat().st_size for entry in os.scandir(ref['dir']))
+        with self._lock:
+            self._refcounts[ref['dir']] = 1
+        return ref
+
+    def load(self, ref):
+        if ref['kind'] == 'series':
+            with open(os.path.join(ref['dir'], ref['file']), 'rb') as f:
+                return pickle.load(f)
+        return attach(ref)
+
+    def retain(self, ref):
+        with self._lock:
+            self._refcounts[ref['dir']] += 1
+
+    def release(self, ref):
+        # 已映射到内存的文件被删除后，映射仍然有效，直到对象被回收
+        with self._lock:
+            if ref['dir'] not in self._refcounts:
+                return
+            self._refcounts[ref['dir']] -= 1
+            if self._refcounts[ref['dir']] > 0:
+                return
+            del self._refcounts[ref['dir']]
+        shutil.rmtree(ref['dir'], ignore_errors=True)
+
+    def close(self):
+        with self._lock:
+            self._refcounts.clear()
+        shutil.rmtree(self.root_dir, ignore_errors=True)
+
+class NamespaceMemory:
+    """
+    代码执行命名空间（g_namespace）的内存记账与落盘管理。
+    命名空间本身保持为普通 dict，exec/eval 查找变量时不经过任何 Python 层的钩子，执行速度不受影响。
+    超出会话内存预算时，把最久未被代码引用的大变量（DataFrame/Series/NumPy 数组）写入磁盘并从命名空间移除；
+    执行代码前由 prepare 按代码中出现的变量名（以及代码调用的函数所读取的全局变量名）把已落盘的变量重新加载回命名空间。
+    :param data_plane: 共享数据平面（SharedDataPlane），落盘的变量若是平面中的数据段，同时释放该数据段
+    """
+    def __init__(self, namespace, budget_bytes=None, min_spill_bytes=None, store=None, data_plane=None):
+        self.namespace = namespace
+        self.data_plane = data_plane
+        self.budget_bytes = budget_bytes if budget_bytes is not None else \
+            int(float(os.getenv('NAMESPACE_MEMORY_BUDGET_MB', '1024')) * 1024 * 1024)
+        self.min_spill_bytes = min_spill_bytes if min_spill_bytes is not None else \
+            int(float(os.getenv('NAMESPACE_SPILL_MIN_MB', '1')) * 1024 * 1024)
+        self.store = store if store is not None else SpillStore()
+        self.spilled = {}    # 变量名 -> 落盘引用
+        self._access = {}    # 变量名 -> 最近一次被引用的序号
+        self._ticks = itertools.count()
+        self.spill_count = 0
+        self.reload_count = 0
+
+    def load(self, name):
+        """
+        将已落盘的变量重新加载回命名空间。
+        :return: 变量值
+        """
+        ref = self.spilled.pop(name)
+        value = self.store.load(ref)
+        self.store.release(ref)
+        self.namespace[name] = value
+        self._access[name] = next(self._ticks)
+        self.reload_count += 1
+        print(f"变量 {name} 已从磁盘重新加载。")
+        return value
+
+    def prepare(self, code):
+        """
+        执行代码前调用：代码中出现的变量名视为被引用，已落盘的同名变量重新加载。
+        代码中引用的函数、类会读取的全局变量（如函数体内使用的全局 DataFrame）同样视为被引用，逐层展开。
+        """
+        self._drop_stale()
+        tick = next(self._ticks)
+        for name in referenced_names(code, self.namespace):
+            if name in self.spilled:
+                self.load(name)
+            if name in self.namespace:
+                self._access[name] = tick
+
+    def fork(self, namespace=None):
+        """
+        创建命名空间的浅拷贝及其管理器，与当前管理器共享落盘文件。
+        """
+        self._drop_stale()
+        clone = NamespaceMemory(dict(self.namespace) if namespace is None else namespace,
+                                budget_bytes=self.budget_bytes, min_spill_bytes=self.min_spill_bytes, store=self.store,
+                                data_plane=self.data_plane)
+        for name, ref in self.spilled.items():
+            self.store.retain(ref)
+            clone.spilled[name] = ref
+        return clone
+
+    def release(self):
+        """
+        释放本管理器持有的落盘数据（用于丢弃 fork 出的副本），其他副本仍共享的文件会保留。
+        """
+        for name in list(self.spilled):
+            self._drop_spilled(name)
+        self._access.clear()
+
+    def close(self):
+        """
+        删除全部落盘文件（共享同一存储的副本也将无法再加载）。
+        """
+        self.release()
+        self.store.close()
+
+    def _drop_spilled(self, name):
+        ref = self.spilled.pop(name, None)
+        if ref is not None:
+            self.store.release(ref)
+
+    def _drop_stale(self):
+        # 被重新赋值的变量不再需要旧的落盘数据
+        for name in [name for name in self.spilled if name in self.namespace]:
+            self._drop_spilled(name)
+
+    def _resident_sizes(self):
+        self._drop_stale()
+        return {name: deep_sizeof(value) for name, value in list(self.namespace.items())
+                if not (name.startswith('__') and name.endswith('__'))}
+
+    def memory_usage(self):
+        """
+        :return: 命名空间的常驻内存总量（字节）
+        """
+        return sum(self._resident_sizes().values())
+
+    def enforce_budget(self):
+        """
+        常驻内存超出预算时，按最近访问从旧到新依次落盘大变量，直到回到预算以内。
+        :return: 本次落盘的变量名列表
+        """
+        sizes = self._resident_sizes()
+        total = sum(sizes.values())
+        if not self.budget_bytes or total <= self.budget_bytes:
+            return []
+        # 从未登记过访问的变量是刚创建的，视为最新
+        tick = next(self._ticks)
+        candidates = sorted(
+            (name for name, size in sizes.items()
+             if size >= self.min_spill_bytes and isinstance(self.namespace[name], (pd.DataFrame, pd.Series, np.ndarray))),
+            key=lambda name: self._access.setdefault(name, tick))
+        spilled = []
+        for name in candidates:
+            if total <= self.budget_bytes:
+                break
+            value = self.namespace[name]
+            ref = self.store.write(value)
+            if ref is None:
+                continue
+            del self.namespace[name]
+            if isinstance(value, pd.DataFrame):
+                # 缓存中仍引用同一份列数据时，落盘不会释放内存，需一并删除对应的查询结果缓存
+                QUERY_CACHE.evict_shared(value)
+            if self.data_plane is not None:
+                # 共享数据平面中的数据段位于内存文件系统，不释放则落盘后内存占用不变
+                self.data_plane.forget(name, value)
+            del value
+            self.spilled[name] = ref
+            total -= sizes[name]
+            spilled.append(name)
+        self.spill_count += len(spilled)
+        return spilled
+
+    def memory_report(self, top_n=10):
+        """
+        生成最占内存的变量报告。
+        """
+        sizes = self._resident_sizes()
+        rows = [(size, name, type(self.namespace[name]).__name__, '常驻') for name, size in sizes.items()]
+        rows += [(ref['disk_bytes'], name, ref['kind'], '已落盘') for name, ref in self.spilled.items()]
+        rows.sort(key=lambda row: row[0], reverse=True)
+        lines = [f"命名空间常驻内存 {sum(sizes.values()) / 1024 / 1024:.2f} MB"
+                 + (f"（预算 {self.budget_bytes / 1024 / 1024:.0f} MB）" if self.budget_bytes else "")
+                 + f"，已落盘变量 {len(self.spilled)} 个："]
+        for size, name, type_name, status in rows[:top_n]:
+            lines.append(f"  {name:<20} {type_name:<12} {size / 1024 / 1024:>10.2f} MB  {status}")
+        return "\n".join(lines)
@@ -0,0 +1,70 @@
+import threading
+from .search_tools import google_search, fetch_page, get_github_readme, extract_github_repos, fetch_github_repos, rank_github_repos
+
+class SearchPrefetcher:
+    """
+    后台预取：在等待用户输入时，提前对原始问题执行知乎与GitHub搜索，并下载页面正文与README。
+    结果只写入 SEARCH_CACHE，不产生文件，后续 get_answer / get_answer_github 调用可直接命中缓存。
+    """
+    def __init__(self, num_results=5):
+        self.num_results = num_results
+        self._cancelled = threading.Event()
+        self._threads = []
+        self.fetched = 0
+
+    def start(self, question):
+        """
+        启动知乎与GitHub两条预取线程，立即返回。
+        """
+        for target in (self._prefetch_zhihu, self._prefetch_github):
+            thread = threading.Thread(target=self._run, args=(target, question), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def cancel(self):
+        """
+        取消预取：已发出的请求会自然结束，后续的请求不再发出。
+        """
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self, target, question):
+        try:
+            target(question)
+        except Exception as e:
+            # 预取失败不影响正常流程，正式调用时会重新请求
+            print(f"后台预取出错（已忽略）: {e}")
+
+    def _prefetch_zhihu(self, question):
+        results = google_search(query=question, num_results=self.num_results, site_url='https://zhihu.com/')
+        if isinstance(results, str):
+            return
+        for item in results:
+            if self.cancelled:
+                return
+            if item.get('link'):
+                fetch_page(item['link'])
+                self.fetched += 1
+
+    def _prefetch_github(self, question):
+        if self.cancelled:
+            return
+        results = google_search(query=question, num_results=self.num_results, site_url='https://github.com/')
+        repos = extract_github_repos(results)
+        if not repos or self.cancelled:
+            return
+        # 配置了 GITHUB_TOKEN 时元数据与README在一次 GraphQL 请求中取回，否则按排序逐个预取README
+        for repo_info in rank_github_repos(question, fetch_github_repos(repos)):
+            if self.cancelled:
+                return
+            if not repo_info['readme']:
+                get_github_readme(repo_info)
+            self.fetched += 1
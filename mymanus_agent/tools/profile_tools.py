@@ -0,0 +1,240 @@
+import os
+import re
+import decimal
+import warnings
+import numpy as np # type: ignore
+import pandas as pd # type: ignore
+from .sql_backends import get_backend
+
+_NUMERIC_SQL_TYPES = re.compile(r'int|decimal|numeric|float|double|real', re.I)
+# 布尔字段（MySQL 的 BOOLEAN 实际存储为 TINYINT(1)）读入后是 0/1 整数，按类别统计取值分布
+_BOOL_SQL_TYPES = re.compile(r'^\s*(?:bool|boolean|tinyint\(1\)|bit\(1\))', re.I)
+_QUANTILES = (0.0, 0.25, 0.5, 0.75, 1.0)
+
+def _fmt(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return '-'
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, (float, np.floating)):
+        return f"{float(value):.4g}"
+    text = str(value)
+    return text if len(text) <= 30 else text[:27] + '...'
+
+def _is_numeric(series):
+    return pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+
+def _decimal_columns(df):
+    # MySQL 的 DECIMAL 字段经 read_sql 读入后是 Decimal 对象列，按数值列处理
+    columns = {}
+    for col in df.columns:
+        if df[col].dtype == object:
+            first = df[col].dropna().head(1)
+            if len(first) and isinstance(first.iloc[0], decimal.Decimal):
+                columns[col] = pd.to_numeric(df[col], errors='coerce')
+    return columns
+
+def profile_frame(df, top_k=5, categorical=()):
+    """
+    对 DataFrame 一次性计算画像：数值列合并为一个 float64 矩阵，空值、分位数、均值、标准差与相关系数均按列向量化计算；
+    其他列（含布尔列）通过一次 value_counts 同时得到不同值个数与高频值。
+    :param categorical: 即使取值为数值也按类别统计的列（如以 0/1 存储的布尔字段）
+    :return: dict，包含 rows、columns（每列的画像）与 correlations（相关系数较强的列对）
+    """
+    decimals = _decimal_columns(df)
+    column_data = {c: decimals.get(c, df[c]) for c in df.columns}
+    numeric_cols = [c for c in df.columns if c not in categorical and _is_numeric(column_data[c])] if len(df) else []
+    profiles = {}
+
+    if numeric_cols and len(df):
+        matrix = np.column_stack([column_data[c].to_numpy(dtype='float64', na_value=np.nan) for c in numeric_cols])
+        nan_mask = np.isnan(matrix)
+        with warnings.catch_warnings(), np.errstate(all='ignore'):
+            # 全为空值的列会产生 RuntimeWarning，结果为 NaN，输出时显示为 '-'
+            warnings.simplefilter('ignore', RuntimeWarning)
+            quantiles = np.nanquantile(matrix, _QUANTILES, axis=0)
+            means = np.nanmean(matrix, axis=0)
+            stds = np.nanstd(matrix, axis=0, ddof=1)
+        nulls = nan_mask.sum(axis=0)
+        for j, col in enumerate(numeric_cols):
+            values, counts = np.unique(matrix[~nan_mask[:, j], j], return_counts=True)
+            profile = {
+                'name': col, 'dtype': str(column_data[col].dtype), 'nulls': int(nulls[j]), 'distinct': len(values),
+                'min': quantiles[0, j], 'q25': quantiles[1, j], 'median': quantiles[2, j], 'q75': quantiles[3, j],
+                'max': quantiles[4, j], 'mean': means[j], 'std': stds[j], 'top': [],
+            }
+            if 0 < len(values) <= top_k * 4:
+                # 取值很少的数值列（编码型类别）同样给出高频值
+                order = np.argsort(counts)[::-1][:top_k]
+                profile['top'] = [(values[i], int(counts[i])) for i in order]
+            profiles[col] = profile
+
+    for col in df.columns:
+        if col in profiles:
+            continue
+        series = df[col]
+        counts = series.value_counts(dropna=True)
+        profile = {'name': col, 'dtype': str(series.dtype), 'nulls': int(series.isna().sum()),
+                   'distinct': len(counts), 'top': []}
+        if len(counts) and counts.iloc[0] > 1:
+            # 每个值只出现一次（如主键、时间戳）时高频值没有意义
+            profile['top'] = list(counts.head(top_k).items())
+        if pd.api.types.is_datetime64_any_dtype(series.dtype) and len(counts):
+            profile['min'], profile['max'] = series.min(), series.max()
+        profiles[col] = profile
+
+    correlations = []
+    if len(numeric_cols) >= 2:
+        complete = matrix[~nan_mask.any(axis=1)]
+        if len(complete) > 2:
+            with np.errstate(all='ignore'):
+                corr = np.corrcoef(complete, rowvar=False)
+            threshold = float(os.getenv('PROFILE_CORR_THRESHOLD', '0.3'))
+            upper_i, upper_j = np.triu_indices(len(numeric_cols), k=1)
+            r = corr[upper_i, upper_j]
+            strong = np.flatnonzero(np.abs(np.nan_to_num(r)) >= threshold)
+            for k in strong[np.argsort(-np.abs(r[strong]))][:10]:
+                correlations.append((numeric_cols[upper_i[k]], numeric_cols[upper_j[k]], float(r[k])))
+
+    return {'rows': len(df), 'columns': [profiles[c] for c in df.columns], 'correlations': correlations}
+
+def _quote(identifier, backend):
+    if backend.name == 'mysql':
+        return '`%s`' % identifier.replace('`', '``')
+    return '"%s"' % identifier.replace('"', '""')
+
+def _sample_sql(backend, table_sql, columns_sql, sample_rows, total_rows):
+    """
+    生成各引擎下只扫描一遍、无需排序的抽样查询。
+    """
+    fraction = min(1.0, sample_rows * 1.2 / max(total_rows, 1))
+    if backend.name == 'mysql':
+        return f"SELECT {columns_sql} FROM {table_sql} WHERE RAND() < {fraction:.6f} LIMIT {sample_rows}"
+    if backend.engine == 'duckdb':
+        return f"SELECT {columns_sql} FROM {table_sql} USING SAMPLE {sample_rows} ROWS"
+    return (f"SELECT {columns_sql} FROM {table_sql} "
+            f"WHERE abs(random()) % 1000000 < {int(fraction * 1000000)} LIMIT {sample_rows}")
+
+def profile_sql_table(backend, connection, table, info, top_k=5, sample_rows=None):
+    """
+    大表画像下推到数据库：一条聚合查询得到精确的行数、空值、不同值个数、最小/最大值与均值，
+    分位数、标准差、高频值与相关系数则基于一次抽样查询估计。
+    """
+    sample_rows = sample_rows or int(os.getenv('PROFILE_SAMPLE_ROWS', '20000'))
+    columns = info['columns']
+    table_sql = _quote(table, backend)
+    bool_cols = {name for name, data_type in columns if _BOOL_SQL_TYPES.match(str(data_type))}
+    numeric_cols = {name for name, data_type in columns
+                    if name not in bool_cols and _NUMERIC_SQL_TYPES.search(str(data_type))}
+    select_items = ['COUNT(*)']
+    for name, data_type in columns:
+        col = _quote(name, backend)
+        select_items += [f"COUNT({col})", f"COUNT(DISTINCT {col})", f"MIN({col})", f"MAX({col})"]
+        select_items.append(f"AVG({col})" if name in numeric_cols else "NULL")
+    aggregates = backend.execute(connection, f"SELECT {', '.join(select_items)} FROM {table_sql}")[0]
+    total_rows = int(aggregates[0])
+
+    columns_sql = ', '.join(_quote(name, backend) for name, _ in columns)
+    sample = backend.read_frame(connection, _sample_sql(backend, table_sql, columns_sql, sample_rows, total_rows))
+    profile = profile_frame(sample, top_k=top_k, categorical=bool_cols)
+    profile['rows'] = total_rows
+    profile['sampled_rows'] = len(sample)
+
+    for i, column_profile in enumerate(profile['columns']):
+        non_null, distinct, min_value, max_value, mean = aggregates[1 + i * 5: 6 + i * 5]
+        column_profile['nulls'] = total_rows - int(non_null)
+        column_profile['distinct'] = int(distinct)
+        if not len(sample):
+            # 抽样为空（表很大而抽样比例很小时可能发生）时读入的列类型均为 object，改为显示字段类型
+            column_profile['dtype'] = str(columns[i][1])
+        # 抽样为空时数值列被当作类别列，最值仍取自精确聚合
+        if 'min' in column_profile or columns[i][0] in numeric_cols:
+            column_profile['min'], column_profile['max'] = min_value, max_value
+        if mean is not None:
+            column_profile['mean'] = float(mean)
+    return profile
+
+def format_profile(profile, title, max_tokens=None):
+    """
+    将画像整理为紧凑文本，超出token预算时先压缩高频值，再省略末尾的列。
+    """
+    max_tokens = max_tokens or int(os.getenv('PROFILE_MAX_TOKENS', '1500'))
+    rows = profile['rows']
+    header = f"{title}：{rows} 行 × {len(profile['columns'])} 列"
+    if 'sampled_rows' in profile:
+        header += f"（行数、空值、不同值、最值与均值为精确统计；分位数、标准差、高频值与相关性基于 {profile['sampled_rows']} 行抽样估计）"
+
+    def column_line(col, top_k):
+        null_rate = col['nulls'] / rows * 100 if rows else 0.0
+        parts = [f"- {col['name']} ({col['dtype']}): 空值 {null_rate:.1f}%，不同值 {col['distinct']}"]
+        if 'median' in col:
+            parts.append(f"min {_fmt(col['min'])} / q25 {_fmt(col['q25'])} / 中位数 {_fmt(col['median'])} / "
+                         f"q75 {_fmt(col['q75'])} / max {_fmt(col['max'])}，均值 {_fmt(col['mean'])}，标准差 {_fmt(col['std'])}")
+        elif 'min' in col:
+            parts.append(f"范围 {_fmt(col['min'])} ~ {_fmt(col['max'])}"
+                         + (f"，均值 {_fmt(col['mean'])}" if 'mean' in col else ""))
+        if col['top'] and top_k:
+            parts.append("高频值: " + ', '.join(f"{_fmt(v)}({c})" for v, c in col['top'][:top_k]))
+        return '，'.join(parts)
+
+    corr_line = ''
+    if profile['correlations']:
+        corr_line = "较强相关的列对：" + ', '.join(f"{a}~{b} {r:.2f}" for a, b, r in profile['correlations'])
+
+    # 粗略按每3个字符1个token估算
+    budget_chars = max_tokens * 3
+    for top_k in (5, 2, 0):
+        lines = [column_line(col, top_k) for col in profile['columns']]
+        text = '\n'.join([header] + lines + ([corr_line] if corr_line else []))
+        if len(text) <= budget_chars:
+            return text
+    kept = []
+    used = len(header) + len(corr_line) + 40
+    for line in lines:
+        if used + len(line) + 1 > budget_chars:
+            break
+        kept.append(line)
+        used += len(line) + 1
+    omitted = len(lines) - len(kept)
+    return '\n'.join([header] + kept + [f"（其余 {omitted} 列因token预算省略）"] + ([corr_line] if corr_line else []))
+
+def profile_table(table=None, df_name=None, g_namespace=None, backend=None, max_tokens=None):
+    """
+    一次性生成数据表画像：字段类型、空值率、不同值个数、分位数、高频值与数值列相关性。
+    :param table: 数据库中的表名；小表读入内存后向量化计算，大表（超过 SQL_LARGE_TABLE_ROWS 行）下推到数据库计算
+    :param df_name: g_namespace 中已有的 DataFrame 变量名，传入时直接对该变量画像
+    :param backend: SQL后端，mysql 或 local，为None时读取环境变量 SQL_BACKEND
+    :param max_tokens: 画像文本的token预算，默认读取 PROFILE_MAX_TOKENS
+    """
+    print("正在调用profile_table工具生成数据画像...")
+    top_k = int(os.getenv('PROFILE_TOP_K', '5'))
+    if df_name:
+        df = (g_namespace or {}).get(df_name)
+        if not isinstance(df, pd.DataFrame):
+            return f"未找到名为 {df_name} 的DataFrame变量。"
+        return format_profile(profile_frame(df, top_k=top_k), f"DataFrame {df_name}", max_tokens)
+    if not table:
+        return "请提供表名 table 或DataFrame变量名 df_name。"
+
+    db_backend, error = get_backend(backend)
+    if error:
+        return error
+    try:
+        connection = db_backend.connect()
+    except Exception as e:
+        return f"数据库连接失败: {e}"
+    try:
+        info = db_backend.table_info(connection, table)
+        if info is None or not info['columns']:
+            return f"未找到数据表 {table}。"
+        if info['rows'] > int(os.getenv('SQL_LARGE_TABLE_ROWS', '100000')):
+            print(f"表 {table} 约 {info['rows']} 行，画像计算下推到数据库执行...")
+            profile = profile_sql_table(db_backend, connection, table, info, top_k=top_k)
+        else:
+            df = db_backend.read_frame(connection, f"SELECT * FROM {_quote(table, db_backend)}")
+            profile = profile_frame(df, top_k=top_k)
+        return format_profile(profile, f"表 {table}", max_tokens)
+    except Exception as e:
+        return f"生成数据画像时出错: {e}"
+    finally:
+        db_backend.close(connection)
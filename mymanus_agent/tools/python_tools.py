@@ -1,21 +1,41 @@
 import matplotlib # type: ignore
 import os
+import uuid
+import types
+import pickle
+import hashlib
+import threading
+import multiprocessing
+import numpy as np # type: ignore
 import matplotlib.pyplot as plt # type: ignore
 import seaborn as sns # type: ignore
 import pandas as pd # type: ignore
+from .shared_data import attach, write_segment, fingerprint
+from .namespace_memory import referenced_names, global_names, REMOTE_GLOBALS_KEY
 # from IPython.display import display, Image # 已移除 IPython.display 的直接依赖
 
-def python_inter(py_code, g_namespace=None):
+# 进程内执行的代码共享 pyplot 全局状态、工作目录等解释器状态，并行子任务中的 python_inter/fig_inter 依次执行
+_EXEC_LOCK = threading.RLock()
+
+def python_inter(py_code, g_namespace=None, data_plane=None):
     """
     专门用于执行python代码，并获取最终查询或处理结果。
     :param py_code: 字符串形式的Python代码，
     :param g_namespace: 字典形式变量，表示环境变量，如果为None，则使用新的空字典
+    :param data_plane: 共享数据平面（SharedDataPlane），传入时代码在独立的执行进程中运行
     :return：代码运行的最终结果
     """    
+    if data_plane is not None:
+        return run_python_in_worker(py_code, g_namespace if g_namespace is not None else {}, data_plane)
+
     print("正在调用python_inter工具运行Python代码...")
     if g_namespace is None:
         g_namespace = {} 
 
+    with _EXEC_LOCK:
+        return _exec_inline(py_code, g_namespace)
+
+def _exec_inline(py_code, g_namespace):
     try:
         return str(eval(py_code, g_namespace)) 
     except Exception: # 更通用的捕获初始eval的失败
@@ -49,6 +69,292 @@ def python_inter(py_code, g_namespace=None):
             return "已经顺利执行代码"
 
 
+def _digest(value):
+    """
+    数据对象的内容摘要，用于发现对已有 DataFrame/数组的原地改值。无法计算时返回 None。
+    """
+    try:
+        if isinstance(value, np.ndarray):
+            data = np.ascontiguousarray(value).reshape(-1).view(np.uint8)
+        else:
+            data = pd.util.hash_pandas_object(value, index=True).to_numpy()
+        return fingerprint(value), hashlib.blake2b(data, digest_size=16).hexdigest()
+    except Exception:
+        return None
+
+def _pickled(value):
+    try:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None # 模块、函数等无法跨进程传递的对象
+
+def _worker_execute(py_code, state, shared_refs, plain_vars, deleted, root_dir):
+    """
+    在执行进程中运行：删除主进程中已删除的变量，把主进程传来的变量合并进该会话常驻的命名空间后执行代码，
+    再把新增、重新赋值或原地修改过的变量写回（数据对象写入共享目录，其余按值返回），并报告被删除的变量。
+    只有代码可能访问到的变量（代码中出现的名字及其调用的函数读取的全局变量）才检查是否被原地修改，
+    其余变量不做内容比较，执行开销与会话中的数据总量无关。
+    导入的模块、定义的函数等无法跨进程传递的对象保留在执行进程的命名空间中，后续调用仍可使用。
+    """
+    namespace = state['namespace']
+    segments = state['segments']  # 变量名 -> (数据段目录, 内容摘要)
+    plain = state['plain']        # 变量名 -> 上次同步时的序列化结果
+    for name in deleted:
+        namespace.pop(name, None)
+        segments.pop(name, None)
+        plain.pop(name, None)
+    for name, ref in shared_refs.items():
+        if name not in namespace or segments.get(name, (None,))[0] != ref['dir']:
+            namespace[name] = attach(ref)
+            segments[name] = (ref['dir'], _digest(namespace[name]))
+    for name, value in plain_vars.items():
+        namespace[name] = value
+        plain[name] = _pickled(value)
+    before = {name: id(value) for name, value in namespace.items() if not name.startswith('__')}
+    touched = referenced_names(py_code, namespace)
+
+    result = python_inter(py_code, namespace)
+
+    new_refs = {}
+    new_plain = {}
+    for name, value in namespace.items():
+        if name.startswith('__'):
+            continue
+        unchanged_id = before.get(name) == id(value)
+        if unchanged_id and name not in touched and (name in segments or name in plain):
+            continue
+        if isinstance(value, (pd.DataFrame, np.ndarray)):
+            digest = _digest(value)
+            if unchanged_id and name in segments and segments[name][1] == digest:
+                continue
+            ref = write_segment(value, root_dir)
+            if ref is not None:
+                segments[name] = (ref['dir'], digest)
+                plain.pop(name, None)
+                new_refs[name] = ref
+                continue
+        segments.pop(name, None)
+        data = _pickled(value)
+        if data is None or (unchanged_id and plain.get(name) == data):
+            continue
+        plain[name] = data
+        new_plain[name] = value
+    removed = [name for name in before if name not in namespace]
+    for name in removed:
+        segments.pop(name, None)
+        plain.pop(name, None)
+    # 只存在于执行进程中的函数与类，主进程据此在执行前重新加载它们读取的已落盘变量
+    remote_globals = {name: sorted(global_names(value)) for name, value in namespace.items()
+                      if not name.startswith('__') and name not in segments and name not in plain
+                      and isinstance(value, (types.FunctionType, types.MethodType, type))}
+    return result, new_refs, new_plain, removed, remote_globals
+
+def _worker_loop(conn):
+    """
+    执行进程主循环：按会话保存常驻命名空间，逐条处理主进程发来的执行或清理请求。
+    """
+    sessions = {}
+    conn.send('ready')
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        if message[0] == 'drop':
+            sessions.pop(message[1], None)
+            continue
+        _, session, parent, py_code, shared_refs, plain_vars, deleted, root_dir = message
+        if session not in sessions:
+            # 从其他会话浅拷贝出的命名空间（如并行子任务）继承其在执行进程中的导入与函数定义
+            base = sessions.get(parent, {'namespace': {}, 'segments': {}, 'plain': {}})
+            sessions[session] = {key: dict(value) for key, value in base.items()}
+        state = sessions[session]
+        try:
+            reply = ('ok', _worker_execute(py_code, state, shared_refs, plain_vars, deleted, root_dir))
+        except Exception as e:
+            reply = ('error', str(e))
+        conn.send(reply)
+
+class PythonWorker:
+    """
+    与一个共享数据平面绑定的常驻执行进程。每个会话（g_namespace）在执行进程中有各自常驻的命名空间，
+    导入、函数定义与数据修改在多次调用之间保持；同一执行进程内的调用依次执行。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._process = None
+        self._conn = None
+        self._sent = {}   # 会话 -> {变量名: 上次同步时主进程中对象的 id}
+        self._known = {}  # 会话 -> 上次同步时主进程命名空间中的变量名，用于发现主进程中删除的变量
+
+    def _start(self):
+        ctx = multiprocessing.get_context('spawn')
+        self._conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(target=_worker_loop, args=(child_conn,), daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._sent.clear()
+        self._known.clear()
+        # 等待执行进程完成启动（导入依赖库），执行超时只计算代码本身的运行时间
+        self._conn.recv()
+
+    def _stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._conn.close()
+        self._process = None
+        self._conn = None
+        self._sent.clear()
+        self._known.clear()
+
+    def execute(self, session, parent, py_code, shared_refs, plain_vars, root_dir, timeout=None):
+        """
+        :param parent: 派生出该会话的会话标识（没有时为 None）
+        :param plain_vars: 其余变量；只有可序列化且在主进程中重新赋值过（对象 id 变化）的变量会发送给执行进程
+        :return: (执行结果, 新数据引用, 新的按值变量, 被删除的变量名, 执行进程中函数与类读取的全局变量名)；
+                 超时或执行进程异常退出时抛出 RuntimeError
+        """
+        with self._lock:
+            if self._process is None or not self._process.is_alive():
+                if self._process is not None:
+                    print("Python执行进程已退出，正在重新启动（之前定义的函数与导入需要重新执行）...")
+                    self._stop()
+                self._start()
+            sent = self._sent.setdefault(session, {})
+            changed = {name: value for name, value in plain_vars.items()
+                       if sent.get(name) != id(value) and _pickled(value) is not None}
+            present = set(shared_refs) | set(plain_vars)
+            deleted = sorted(self._known.get(session, set()) - present)
+            try:
+                self._conn.send(('run', session, parent, py_code, shared_refs, changed, deleted, root_dir))
+                if not self._conn.poll(timeout):
+                    self._stop()
+                    raise RuntimeError(f"代码执行超时（超过 {timeout} 秒），执行进程已重启，之前定义的函数与导入需要重新执行")
+                status, payload = self._conn.recv()
+            except (EOFError, OSError) as e:
+                self._stop()
+                raise RuntimeError(f"执行进程异常退出: {e}")
+            if status != 'ok':
+                raise RuntimeError(payload)
+            for name, value in changed.items():
+                sent[name] = id(value)
+            for name in deleted:
+                sent.pop(name, None)
+            self._known[session] = present
+            return payload
+
+    def record(self, session, name, value):
+        """
+        记录主进程中与执行进程同步过的对象，下次调用时无需重新发送。
+        """
+        with self._lock:
+            self._sent.setdefault(session, {})[name] = id(value)
+            self._known.setdefault(session, set()).add(name)
+
+    def forget(self, session, name):
+        with self._lock:
+            self._sent.get(session, {}).pop(name, None)
+            self._known.get(session, set()).discard(name)
+
+    def drop_session(self, session):
+        with self._lock:
+            self._sent.pop(session, None)
+            self._known.pop(session, None)
+            if self._process is not None and self._process.is_alive():
+                self._conn.send(('drop', session))
+
+    def close(self):
+        with self._lock:
+            if self._process is not None and self._process.is_alive():
+                try:
+                    self._conn.send(None)
+                    self._process.join(timeout=5)
+                except OSError:
+                    pass
+            self._stop()
+
+_WORKERS = {}
+_WORKERS_LOCK = threading.Lock()
+_SESSION_KEY = '__mymanus_worker_session__'
+
+def _get_worker(data_plane):
+    with _WORKERS_LOCK:
+        worker = _WORKERS.get(data_plane.root_dir)
+        if worker is None:
+            worker = _WORKERS[data_plane.root_dir] = PythonWorker()
+        return worker
+
+def _session_of(g_namespace):
+    """
+    会话标识记录在命名空间中并带上字典的 id，命名空间被浅拷贝（如并行子任务）时得到新的会话。
+    :return: (会话标识, 派生出该会话的会话标识)
+    """
+    key = g_namespace.get(_SESSION_KEY)
+    if key and key[0] == id(g_namespace):
+        return key[1], None
+    parent = key[1] if key else None
+    g_namespace[_SESSION_KEY] = (id(g_namespace), uuid.uuid4().hex)
+    return g_namespace[_SESSION_KEY][1], parent
+
+def release_python_session(g_namespace, data_plane):
+    """
+    丢弃执行进程中与 g_namespace 对应的常驻命名空间（如并行子任务结束时）。
+    """
+    key = g_namespace.get(_SESSION_KEY)
+    if data_plane is not None and key and key[0] == id(g_namespace):
+        _get_worker(data_plane).drop_session(key[1])
+
+def close_python_worker(data_plane):
+    """
+    结束与共享数据平面绑定的执行进程（会话结束或重置时调用）。
+    """
+    with _WORKERS_LOCK:
+        worker = _WORKERS.pop(data_plane.root_dir, None)
+    if worker is not None:
+        worker.close()
+
+def run_python_in_worker(py_code, g_namespace, data_plane):
+    """
+    在独立的执行进程中运行Python代码。每个会话在执行进程中有常驻的命名空间，导入的模块、定义的函数
+    在多次调用之间保持可用。命名空间中的 DataFrame/NumPy 数组通过共享数据平面按引用传递，
+    其余可序列化变量按值传递；执行进程中新增、重新赋值或原地修改过的变量会合并回 g_namespace，
+    被删除的变量也会从 g_namespace 中删除；主进程中删除（或落盘）的变量同样会从执行进程中删除。
+    """
+    print("正在调用python_inter工具在执行进程中运行Python代码...")
+    session, parent = _session_of(g_namespace)
+    worker = _get_worker(data_plane)
+    shared_refs = data_plane.export_namespace(g_namespace)
+    plain_vars = {name: value for name, value in g_namespace.items()
+                  if name not in shared_refs and not name.startswith('__')}
+
+    timeout = os.getenv('PYTHON_WORKER_TIMEOUT')
+    try:
+        result, new_refs, new_plain, removed, remote_globals = worker.execute(session, parent, py_code, shared_refs, plain_vars,
+                                                             data_plane.root_dir, float(timeout) if timeout else None)
+    except Exception as e:
+        return f"代码执行时报错 {e}"
+    finally:
+        for ref in shared_refs.values():
+            data_plane.release(ref['dir'])
+
+    for name, ref in new_refs.items():
+        obj = attach(ref)
+        data_plane.adopt(name, ref, obj)
+        g_namespace[name] = obj
+        worker.record(session, name, obj)
+    for name, value in new_plain.items():
+        g_namespace[name] = value
+        worker.record(session, name, value)
+    for name in removed:
+        g_namespace.pop(name, None)
+        worker.forget(session, name)
+    g_namespace[REMOTE_GLOBALS_KEY] = remote_globals
+    return result
+
+
 def fig_inter(py_code, fname, g_namespace=None):
     """
     执行Python绘图代码，保存图像。
@@ -64,7 +370,11 @@ def fig_inter(py_code, fname, g_namespace=None):
     g_namespace.setdefault('plt', plt)
     g_namespace.setdefault('sns', sns)
     g_namespace.setdefault('pd', pd)
-    
+
+    with _EXEC_LOCK:
+        return _draw_figure(py_code, fname, g_namespace)
+
+def _draw_figure(py_code, fname, g_namespace):
     current_backend = matplotlib.get_backend()
     matplotlib.use('Agg') 
 
@@ -0,0 +1,164 @@
+import os
+import re
+import sys
+import time
+import threading
+from collections import OrderedDict
+import numpy as np # type: ignore
+import pandas as pd # type: ignore
+
+# 缓存键中统一为小写的SQL关键字与常用函数名。表名、列名与别名保持原样：
+# MySQL 在 Linux 上的表名、引号中的标识符等是区分大小写的，统一小写会让不同的查询命中同一条缓存
+_SQL_KEYWORDS = frozenset("""
+select from where and or not group by order limit offset having join left right inner outer full cross
+on using as distinct all union intersect except in is null like between case when then else end asc desc
+with exists any some show tables columns databases describe explain true false interval
+count sum avg min max
+""".split())
+_WORD_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_$]*')
+
+def _lower_keywords(segment):
+    return _WORD_RE.sub(lambda m: m.group(0).lower() if m.group(0).lower() in _SQL_KEYWORDS else m.group(0), segment)
+
+def normalize_sql(sql_query):
+    """
+    规范化SQL文本作为缓存键：引号之外的空白折叠为单个空格、SQL关键字转为小写，去掉末尾分号。
+    标识符与引号内的内容保持原样。
+    """
+    parts = []
+    segment = []
+    quote = None
+    pending_space = False
+    i = 0
+    while i < len(sql_query):
+        ch = sql_query[i]
+        if quote:
+            parts.append(ch)
+            if ch == '\\' and i + 1 < len(sql_query):
+                parts.append(sql_query[i + 1])
+                i += 1
+            elif ch == quote:
+                quote = None
+        elif ch.isspace():
+            pending_space = bool(parts or segment)
+        else:
+            if pending_space:
+                segment.append(' ')
+                pending_space = False
+            if ch in ("'", '"', '`'):
+                parts.append(_lower_keywords(''.join(segment)))
+                segment = []
+                quote = ch
+                parts.append(ch)
+            else:
+                segment.append(ch)
+        i += 1
+    parts.append(_lower_keywords(''.join(segment)))
+    return ''.join(parts).rstrip(';').rstrip()
+
+def _copy_on_write_enabled():
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    return pd.get_option('mode.copy_on_write') is True
+
+def share_frame(df):
+    """
+    返回与缓存共享数据的DataFrame。开启Copy-on-Write（pandas>=3 默认开启）时为浅拷贝，
+    修改只会复制被修改的列，不影响缓存；否则退化为深拷贝。
+    """
+    return df.copy(deep=not _copy_on_write_enabled())
+
+def _column_arrays(df):
+    return [df.iloc[:, i].to_numpy() for i in range(df.shape[1]) if isinstance(df.dtypes.iloc[i], np.dtype)]
+
+def _size_of(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return sys.getsizeof(value)
+
+class QueryResultCache:
+    """
+    只读查询结果缓存：按 (结果类型, 数据源, 规范化SQL) 作键，带TTL过期和按内存上限的LRU淘汰。
+    """
+    def __init__(self, max_bytes=None, ttl=None):
+        self.max_bytes = max_bytes if max_bytes is not None else int(float(os.getenv('SQL_RESULT_CACHE_MB', '256')) * 1024 * 1024)
+        self.ttl = ttl if ttl is not None else float(os.getenv('SQL_RESULT_CACHE_TTL', '600'))
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _key(self, kind, source_key, sql_query):
+        return (kind, source_key, normalize_sql(sql_query))
+
+    def get(self, kind, source_key, sql_query):
+        key = self._key(kind, source_key, sql_query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, nbytes, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self._bytes -= nbytes
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return share_frame(value) if isinstance(value, pd.DataFrame) else value
+
+    def put(self, kind, source_key, sql_query, value):
+        if not self.enabled:
+            return
+        nbytes = _size_of(value)
+        if nbytes > self.max_bytes:
+            return
+        if isinstance(value, pd.DataFrame):
+            value = share_frame(value)
+        key = self._key(kind, source_key, sql_query)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (time.monotonic(), nbytes, value)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_bytes, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_bytes
+
+    def invalidate(self, source_key=None):
+        """
+        作废某个数据源（为None时为全部数据源）的缓存结果。
+        """
+        with self._lock:
+            for key in [k for k in self._entries if source_key is None or k[1] == source_key]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def evict_shared(self, df):
+        """
+        删除与 df 共享列数据的缓存结果（Copy-on-Write 下 extract_data 放入命名空间的是缓存结果的浅拷贝），
+        使命名空间中的变量落盘后内存能够真正释放。
+        :return: 删除的缓存条目数
+        """
+        arrays = _column_arrays(df)
+        if not arrays:
+            return 0
+        with self._lock:
+            shared = [key for key, (_, _, value) in self._entries.items()
+                      if isinstance(value, pd.DataFrame)
+                      and any(np.may_share_memory(a, b) for a in arrays for b in _column_arrays(value))]
+            for key in shared:
+                self._bytes -= self._entries.pop(key)[1]
+        return len(shared)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+QUERY_CACHE = QueryResultCache()
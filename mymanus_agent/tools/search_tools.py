@@ -2,12 +2,19 @@ import os
 import requests # type: ignore
 import json
 import base64
+import hashlib
+import math
 import tiktoken # type: ignore
 import time
+import threading
 import webbrowser
-from lxml import etree # type: ignore
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlsplit, urlunsplit
 from dotenv import load_dotenv # type: ignore
 from .utils import windows_compatible_name 
+from .html_extract import SITE_RULES, match_site_rule, extract_page, page_to_text
+from .knowledge_index import local_answer, tokenize
 
 load_dotenv(override=True)
 
@@ -21,6 +28,163 @@ if HTTP_PROXY or HTTPS_PROXY:
     if HTTPS_PROXY:
         PROXIES['https'] = HTTPS_PROXY
 
+class SearchCache:
+    """
+    搜索结果、页面正文与README的进程内缓存（带过期时间），
+    使后台预取与后续的工具调用共享同一份网络请求结果。只缓存成功的结果。
+    """
+    def __init__(self, ttl=None, max_entries=512):
+        self.ttl = ttl if ttl is not None else float(os.getenv('SEARCH_CACHE_TTL', '1800'))
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, record=True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += record
+                return None
+            self.hits += record
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # 淘汰最早写入的条目
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic(), value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+SEARCH_CACHE = SearchCache()
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    请求合并（single-flight）：同一时刻对同一键（规范化后的查询或URL）的并发请求只发出一次，
+    其余调用方等待并共享该次请求的结果（或异常）。同时限制对每个主机的并发请求数（SEARCH_HOST_CONCURRENCY）。
+    等待超过 SEARCH_FLIGHT_WAIT_S 秒（0 表示不限）仍未完成时，等待方改为自行发出请求，避免被卡住的请求拖住所有调用方。
+    """
+    def __init__(self, host_limit=None, wait_timeout=None):
+        self.host_limit = host_limit if host_limit is not None else int(os.getenv('SEARCH_HOST_CONCURRENCY', '4'))
+        self.wait_timeout = wait_timeout if wait_timeout is not None else float(os.getenv('SEARCH_FLIGHT_WAIT_S', '30'))
+        self._flights = {}
+        self._host_slots = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.host_wait_s = 0.0
+
+    def _kind_stats(self, kind):
+        return self._stats.setdefault(kind, {'requests': 0, 'fetches': 0, 'coalesced': 0, 'errors': 0, 'wait_timeouts': 0})
+
+    @contextmanager
+    def _host_slot(self, host):
+        if not self.host_limit or not host:
+            yield
+            return
+        with self._lock:
+            slot = self._host_slots.setdefault(host, threading.BoundedSemaphore(self.host_limit))
+        started = time.monotonic()
+        with slot:
+            with self._lock:
+                self.host_wait_s += time.monotonic() - started
+            yield
+
+    def do(self, key, host, fetch):
+        """
+        执行一次可合并的请求。
+        :param key: 请求键，元组第一项为请求类别（search/page/readme），用于分类统计
+        :param host: 目标主机名，用于并发限制
+        :param fetch: 实际发出请求的无参函数
+        :return: fetch 的返回值；fetch 抛出异常时，所有等待方都会收到同一异常
+        """
+        with self._lock:
+            stats = self._kind_stats(key[0])
+            stats['requests'] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                stats['fetches'] += 1
+            else:
+                stats['coalesced'] += 1
+        if not leader:
+            if flight.done.wait(self.wait_timeout or None):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+            with self._lock:
+                stats['wait_timeouts'] += 1
+                stats['coalesced'] -= 1
+                stats['fetches'] += 1
+            print(f"等待相同请求超过 {self.wait_timeout:g} 秒，改为单独发出请求。")
+            try:
+                with self._host_slot(host):
+                    return fetch()
+            except Exception:
+                with self._lock:
+                    stats['errors'] += 1
+                raise
+
+        try:
+            with self._host_slot(host):
+                flight.result = fetch()
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'kinds': {kind: dict(stats) for kind, stats in self._stats.items()},
+                'in_flight': len(self._flights),
+                'host_wait_s': round(self.host_wait_s, 3),
+            }
+
+    def summary(self):
+        stats = self.stats()
+        lines = [f"{kind}：请求 {s['requests']} 次，实际发出 {s['fetches']} 次，合并 {s['coalesced']} 次，失败 {s['errors']} 次"
+                 + (f"，等待超时 {s['wait_timeouts']} 次" if s['wait_timeouts'] else "")
+                 for kind, s in stats['kinds'].items() if s['requests']]
+        if lines and stats['host_wait_s']:
+            lines.append(f"等待主机并发配额共 {stats['host_wait_s']:.1f} 秒")
+        return "\n".join(lines)
+
+SEARCH_FLIGHTS = SingleFlight()
+
+def _coalesced(key, url, fetch):
+    """
+    先查缓存，未命中时经 SEARCH_FLIGHTS 合并并发的相同请求；
+    发出请求前再查一次缓存，避免刚结束的同键请求在缓存写入与出队之间被重复发出。
+    """
+    cached = SEARCH_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    def fetch_once():
+        cached = SEARCH_CACHE.get(key, record=False)
+        return cached if cached is not None else fetch()
+
+    return SEARCH_FLIGHTS.do(key, urlparse(url).hostname, fetch_once)
+
 def google_search(query, num_results=10, site_url=None):
     api_key = os.getenv("GOOGLE_SEARCH_API_KEY")
     cse_id = os.getenv("CSE_ID")
@@ -37,27 +201,52 @@ def google_search(query, num_results=10, site_url=None):
     }
     if site_url:
         params['siteSearch'] = site_url
-    
-    try:
-        response = requests.get(url, params=params, proxies=PROXIES) 
-        response.raise_for_status() 
-        search_results_json = response.json()
-        search_items = search_results_json.get('items', [])
-        
-        results = [{
-            'title': item['title'],
-            'link': item['link'],
-            'snippet': item['snippet']
-        } for item in search_items]
-        return results
-    except requests.exceptions.RequestException as e:
-        return f"Google搜索请求失败: {e}"
-    except json.JSONDecodeError:
-        return "Google搜索响应不是有效的JSON格式。"
-    except KeyError:
-        return "Google搜索响应中缺少预期的键。"
 
-def get_search_text(q, url): 
+    cache_key = ('search', ' '.join(query.split()).lower(), num_results, site_url)
+
+    def fetch():
+        try:
+            response = requests.get(url, params=params, proxies=PROXIES) 
+            response.raise_for_status() 
+            search_results_json = response.json()
+            search_items = search_results_json.get('items', [])
+            
+            results = [{
+                'title': item['title'],
+                'link': item['link'],
+                'snippet': item['snippet']
+            } for item in search_items]
+            SEARCH_CACHE.put(cache_key, results)
+            return results
+        except requests.exceptions.RequestException as e:
+            return f"Google搜索请求失败: {e}"
+        except json.JSONDecodeError:
+            return "Google搜索响应不是有效的JSON格式。"
+        except KeyError:
+            return "Google搜索响应中缺少预期的键。"
+
+    return _coalesced(cache_key, url, fetch)
+
+def normalize_url(url):
+    """
+    规范化URL作为缓存与请求合并的键：协议与主机名转为小写，去掉片段（#...）与路径末尾的斜杠。
+    路径与查询参数区分大小写，保持原样。
+    """
+    parts = urlsplit(url.strip())
+    netloc = parts.netloc
+    if parts.hostname:
+        host = parts.hostname + (f":{parts.port}" if parts.port else '')
+        netloc = netloc.rsplit('@', 1)[0] + '@' + host if '@' in netloc else host
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path.rstrip('/'), parts.query, ''))
+
+def fetch_page(url):
+    """
+    下载并解析页面，返回 extract_page 的结果（title/paragraphs/code/method）。成功提取到标题的页面会被缓存，
+    同一URL（规范化后）的并发请求只下载一次。
+    """
+    return _coalesced(('page', normalize_url(url)), url, lambda: _download_page(url))
+
+def _download_page(url):
     cookie = os.getenv('search_cookie')
     user_agent = os.getenv('search_ueser_agent')
 
@@ -72,61 +261,38 @@ def get_search_text(q, url):
         'upgrade-insecure-requests': '1',
         'user-agent': user_agent,
     }
-    
-    title_text = None
-    text_d_list = []
-    code_list = []
 
+    rule_name = match_site_rule(url)
+    if rule_name is not None:
+        headers['authority'] = SITE_RULES[rule_name]['authority']
+    response = requests.get(url, headers=headers, proxies=PROXIES, stream=True)
+    content_type = response.headers.get('content-type', '').lower()
+    page_encoding = response.encoding if 'charset' in content_type and response.encoding else 'utf-8'
     try:
-        if 'zhihu.com/question' in url and 'answer' not in url: 
-            headers['authority'] = 'www.zhihu.com'
-            res_text = requests.get(url, headers=headers, proxies=PROXIES).text
-            res_xpath = etree.HTML(res_text)
-            title_elements = res_xpath.xpath('//div/div[1]/div/h1/text()')
-            if title_elements: title_text = title_elements[0]
-            text_d_list = res_xpath.xpath('//div/div/div/div[2]/div/div[2]/div/div/div[2]/span[1]/div/div/span/p/text()')
-        
-        elif 'zhuanlan.zhihu.com' in url: 
-            headers['authority'] = 'zhuanlan.zhihu.com' 
-            res_text = requests.get(url, headers=headers, proxies=PROXIES).text
-            res_xpath = etree.HTML(res_text)
-            title_elements = res_xpath.xpath('//div[1]/div/main/div/article/header/h1/text()')
-            if title_elements: title_text = title_elements[0]
-            text_d_list = res_xpath.xpath('//div/main/div/article/div[1]/div/div/div/p/text()')
-            code_list = res_xpath.xpath('//div/main/div/article/div[1]/div/div/div//pre/code/text()')  
-            
-        elif 'zhihu.com/question' in url and 'answer' in url: 
-            headers['authority'] = 'www.zhihu.com'
-            res_text = requests.get(url, headers=headers, proxies=PROXIES).text
-            res_xpath = etree.HTML(res_text)
-            title_elements = res_xpath.xpath('//div/div[1]/div/h1/text()') 
-            if title_elements: title_text = title_elements[0] 
-            text_d_list = res_xpath.xpath('//div[contains(@class, "AnswerItem")]//div[contains(@class, "RichContent-inner")]//span[contains(@class, "RichText")]//p/text()')
-            if not text_d_list: 
-                 text_d_list = res_xpath.xpath('//div[1]/div/div[3]/div/div/div/div[2]/span[1]/div/div/span/p/text()')
-
-        if not title_text: 
-            print(f"警告: 未能从 {url} 提取到标题。")
-            return None 
+        page = extract_page(response.iter_content(chunk_size=64 * 1024), url, encoding=page_encoding)
+    finally:
+        response.close()
+    if page['title']:
+        SEARCH_CACHE.put(('page', normalize_url(url)), page)
+    return page
 
-        title = windows_compatible_name(title_text if title_text else "untitled_zhihu_page")
+def get_search_text(q, url): 
+    try:
+        page = fetch_page(url)
 
-        text_content = ''
-        for t_item in text_d_list:
-            txt = str(t_item).replace('\n', ' ').strip()
-            if txt: text_content += txt + " " 
+        if not page['title']: 
+            print(f"警告: 未能从 {url} 提取到标题。")
+            return None 
 
-        if code_list:
-            for c_item in code_list:
-                co = str(c_item).replace('\n', ' ') 
-                text_content += "\n```\n" + co.strip() + "\n```\n" 
+        title = windows_compatible_name(page['title'])
+        text_content = page_to_text(page)
 
         encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")     
         json_data = [{
             "link": url,
             "title": title,
-            "content": text_content.strip(),
-            "tokens": len(encoding.encode(text_content.strip()))
+            "content": text_content,
+            "tokens": len(encoding.encode(text_content))
         }]
         
         dir_path = f'./auto_search/{windows_compatible_name(q)}' 
@@ -149,6 +315,11 @@ def get_answer(q, g_namespace=None):
     """
     当你无法回答某个问题时，调用该函数，能够获得答案 (主要针对知乎)
     """
+    local_content = local_answer(q)
+    if local_content:
+        print('本地知识库已覆盖该问题，跳过联网搜索...')
+        return local_content
+
     print('正在接入谷歌搜索，查找和问题相关的答案...')
     search_results = google_search(query=q, num_results=5, site_url='https://zhihu.com/')
     
@@ -221,49 +392,245 @@ def get_answer(q, g_namespace=None):
     print(f"已处理以下文章标题: {', '.join(processed_titles)}")
     return content_accumulator.strip()
 
-def get_github_readme(dic):
+class GitHubETagCache:
+    """
+    GitHub REST 响应的磁盘缓存（按URL保存 ETag 与响应正文），用于条件请求：
+    请求时携带 If-None-Match，内容未变化时GitHub返回 304，直接复用本地正文，且不消耗速率配额。
+    """
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or os.getenv('GITHUB_ETAG_CACHE_DIR', './.mymanus_cache/github')
+        self.not_modified = 0
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, url):
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url, etag, content_type, body):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'etag': etag, 'content_type': content_type, 'body': body}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+GITHUB_ETAGS = GitHubETagCache()
+
+def _github_headers(accept="application/vnd.github.v3+json"):
+    headers = {
+        "Accept": accept,
+        "User-Agent": os.getenv('search_user_agent', 'MyPythonApp/1.0')
+    }
     github_token = os.getenv('GITHUB_TOKEN')
-    user_agent = os.getenv('search_user_agent', 'MyPythonApp/1.0') 
+    if github_token:
+        headers["Authorization"] = f"token {github_token}"
+    return headers
+
+def _github_get(url, accept="application/vnd.github.v3+json"):
+    """
+    带 ETag 条件请求的 GitHub REST GET。
+    :return: (content_type, 正文文本)；HTTP错误以 requests.exceptions.HTTPError 抛出
+    """
+    headers = _github_headers(accept)
+    cached = GITHUB_ETAGS.get(url)
+    if cached:
+        headers["If-None-Match"] = cached['etag']
+    response = requests.get(url, headers=headers, proxies=PROXIES)
+    if response.status_code == 304 and cached:
+        GITHUB_ETAGS.not_modified += 1
+        return cached['content_type'], cached['body']
+    response.raise_for_status()
+    content_type = response.headers.get('content-type', '').lower()
+    etag = response.headers.get('ETag')
+    if etag:
+        GITHUB_ETAGS.put(url, etag, content_type, response.text)
+    return content_type, response.text
 
+def get_github_readme(dic):
+    content, error = _github_readme_result(dic)
+    return content if error is None else error
+
+def _github_readme_result(dic):
+    """
+    :return: (README原文, None) 或 (None, 错误信息)
+    """
     owner = dic.get('owner')
     repo = dic.get('repo')
 
     if not owner or not repo:
-        return "Owner或Repo信息不完整。"
-    if not github_token: 
+        return None, "Owner或Repo信息不完整。"
+    if not os.getenv('GITHUB_TOKEN'): 
         print("警告: GITHUB_TOKEN未配置，请求可能受限或失败。")
 
-    headers = {
-        "Accept": "application/vnd.github.v3.raw", 
-        "User-Agent": user_agent
-    }
-    if github_token: 
-        headers["Authorization"] = f"token {github_token}"
-
     readme_url = f"https://api.github.com/repos/{owner}/{repo}/readme"
-    
-    try:
-        response = requests.get(readme_url, headers=headers, proxies=PROXIES)
-        response.raise_for_status()
-        
+    # GitHub 的 owner/repo 不区分大小写
+    cache_key = ('readme', owner.lower(), repo.lower())
+
+    def fetch():
         try:
-            readme_data = response.json() 
-            encoded_content = readme_data.get('content', '')
-            if not encoded_content:
-                return f"未能从 {readme_url} 的JSON响应中获取README内容。"
-            decoded_content = base64.b64decode(encoded_content).decode('utf-8')
-            return decoded_content
-        except json.JSONDecodeError: 
-             return response.text 
-
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 404: # type: ignore
-            return f"项目 {owner}/{repo} 的README文件未找到。"
-        return f"请求GitHub README失败: {e}"
-    except requests.exceptions.RequestException as e:
-        return f"请求GitHub README时发生网络错误: {e}"
-    except Exception as e_general:
-        return f"处理GitHub README时发生未知错误: {e_general}"
+            content_type, body = _github_get(readme_url, accept="application/vnd.github.v3.raw")
+            # raw 媒体类型直接返回README原文；只有返回JSON对象时内容才是base64编码
+            if 'application/json' in content_type:
+                encoded_content = json.loads(body).get('content', '')
+                if not encoded_content:
+                    return None, f"未能从 {readme_url} 的JSON响应中获取README内容。"
+                body = base64.b64decode(encoded_content).decode('utf-8')
+            SEARCH_CACHE.put(cache_key, (body, None))
+            return body, None
+
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 404: # type: ignore
+                return None, f"项目 {owner}/{repo} 的README文件未找到。"
+            return None, f"请求GitHub README失败: {e}"
+        except requests.exceptions.RequestException as e:
+            return None, f"请求GitHub README时发生网络错误: {e}"
+        except Exception as e_general:
+            return None, f"处理GitHub README时发生未知错误: {e_general}"
+
+    return _coalesced(cache_key, readme_url, fetch)
+
+def get_github_repo_info(dic):
+    """
+    通过REST（ETag条件请求）获取仓库元数据。
+    :return: 包含 stars、description、topics 的字典；仓库不存在时返回 False，其他失败返回 None
+    """
+    owner, repo = dic['owner'], dic['repo']
+    repo_url = f"https://api.github.com/repos/{owner}/{repo}"
+    cache_key = ('repo', owner.lower(), repo.lower())
+
+    def fetch():
+        try:
+            _, body = _github_get(repo_url)
+            data = json.loads(body)
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return False
+            print(f"获取仓库 {owner}/{repo} 的元数据失败: {e}")
+            return None
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"获取仓库 {owner}/{repo} 的元数据失败: {e}")
+            return None
+        info = {'stars': data.get('stargazers_count', 0), 'description': data.get('description') or '',
+                'topics': data.get('topics') or []}
+        SEARCH_CACHE.put(cache_key, info)
+        return info
+
+    return _coalesced(cache_key, repo_url, fetch)
+
+_README_PATHS = ('README.md', 'readme.md', 'Readme.md', 'README.rst', 'README.markdown', 'README.txt', 'README')
+
+def _graphql_repos(repos, github_token):
+    """
+    用一次 GraphQL 请求获取全部仓库的元数据与README原文。
+    :return: {(owner小写, repo小写): 仓库信息}，不存在的仓库不在结果中
+    """
+    readme_fields = ' '.join(f'readme{i}: object(expression: "HEAD:{path}") {{ ... on Blob {{ text }} }}'
+                             for i, path in enumerate(_README_PATHS))
+    fields = ("nameWithOwner stargazerCount description "
+              "repositoryTopics(first: 10) { nodes { topic { name } } } " + readme_fields)
+    declarations, selections, variables = [], [], {}
+    for i, repo_info in enumerate(repos):
+        declarations.append(f"$o{i}: String!, $n{i}: String!")
+        selections.append(f"r{i}: repository(owner: $o{i}, name: $n{i}) {{ {fields} }}")
+        variables[f"o{i}"], variables[f"n{i}"] = repo_info['owner'], repo_info['repo']
+    query = f"query({', '.join(declarations)}) {{ {' '.join(selections)} }}"
+
+    headers = _github_headers()
+    headers["Authorization"] = f"bearer {github_token}"
+    response = requests.post("https://api.github.com/graphql", json={'query': query, 'variables': variables},
+                             headers=headers, proxies=PROXIES)
+    response.raise_for_status()
+    payload = response.json()
+    data = payload.get('data')
+    if data is None:
+        raise ValueError(payload.get('errors'))
+
+    results = {}
+    for i, repo_info in enumerate(repos):
+        node = data.get(f"r{i}")
+        if not node:
+            continue
+        readme = next((node[f"readme{j}"]['text'] for j in range(len(_README_PATHS))
+                       if node.get(f"readme{j}") and node[f"readme{j}"].get('text')), None)
+        results[(repo_info['owner'].lower(), repo_info['repo'].lower())] = {
+            'stars': node.get('stargazerCount', 0),
+            'description': node.get('description') or '',
+            'topics': [n['topic']['name'] for n in (node.get('repositoryTopics') or {}).get('nodes', [])],
+            'readme': readme,
+        }
+    return results
+
+def fetch_github_repos(repos):
+    """
+    批量获取候选仓库的元数据（stars、description、topics），配置了 GITHUB_TOKEN 时通过一次 GraphQL 请求
+    同时取回README原文；否则对每个仓库发出 ETag 条件REST请求，README留待排序后按需获取。
+    已缓存的仓库不再请求。
+    :return: 仓库字典列表，在 owner/repo 之外增加 stars、description、topics 与 readme（未取回时为 None）
+    """
+    results = []
+    missing = []
+    for repo_info in repos:
+        key = (repo_info['owner'].lower(), repo_info['repo'].lower())
+        info = SEARCH_CACHE.get(('repo',) + key)
+        if info is None:
+            missing.append(repo_info)
+        results.append((repo_info, key, info))
+
+    github_token = os.getenv('GITHUB_TOKEN')
+    fetched = {}
+    rest_info = {}
+    if missing and github_token:
+        try:
+            fetched = _graphql_repos(missing, github_token)
+            for key, info in fetched.items():
+                if info['readme']:
+                    SEARCH_CACHE.put(('readme',) + key, (info['readme'], None))
+                SEARCH_CACHE.put(('repo',) + key, {k: v for k, v in info.items() if k != 'readme'})
+            # GraphQL 返回 null 的仓库不存在或无权访问，不再回退到REST
+            missing = []
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            print(f"GitHub GraphQL 批量请求失败，改用REST逐个请求: {e}")
+    if missing:
+        # 元数据请求并发发出，并发数受 SEARCH_FLIGHTS 的单主机并发上限约束
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            for repo_info, info in zip(missing, executor.map(get_github_repo_info, missing)):
+                rest_info[(repo_info['owner'].lower(), repo_info['repo'].lower())] = info
+
+    repos_out = []
+    for repo_info, key, info in results:
+        if info is None and key in fetched:
+            info = fetched[key]
+        elif info is None and key in rest_info:
+            info = rest_info[key]
+            if info is None:
+                # 元数据获取失败（如触发速率限制）的仓库仍保留，排序时热度按 0 计
+                info = {'stars': 0, 'description': '', 'topics': []}
+        if not info:
+            continue
+        cached_readme = SEARCH_CACHE.get(('readme',) + key, record=False)
+        readme = info.get('readme') or (cached_readme[0] if cached_readme else None)
+        repos_out.append({**repo_info, 'stars': info['stars'], 'description': info['description'],
+                          'topics': info['topics'], 'readme': readme})
+    return repos_out
+
+def rank_github_repos(q, repos):
+    """
+    按元数据对仓库排序：检索词在仓库名、描述与topics中的覆盖率，加上按星标数对数缩放的热度（100万星约计 1 分）。
+    """
+    terms = set(tokenize(q))
+
+    def score(repo_info):
+        text = ' '.join([repo_info['owner'], repo_info['repo'], repo_info.get('description') or ''] +
+                        list(repo_info.get('topics') or []))
+        relevance = len(terms & set(tokenize(text))) / len(terms) if terms else 0.0
+        return relevance + math.log10(repo_info.get('stars', 0) + 1) / 6
+
+    return sorted(repos, key=score, reverse=True)
 
 def extract_github_repos(search_results):
     if isinstance(search_results, str): 
@@ -294,10 +661,12 @@ def get_search_text_github(q, dic):
 
     title = windows_compatible_name(f"{owner}_{repo}") 
     
-    text_content = get_github_readme(dic)
-    if "失败" in text_content or "未找到" in text_content or "错误" in text_content: 
-        print(f"获取 {owner}/{repo} 的README失败: {text_content}")
-        return None
+    text_content = dic.get('readme')
+    if not text_content:
+        text_content, error = _github_readme_result(dic)
+        if error is not None: 
+            print(f"获取 {owner}/{repo} 的README失败: {error}")
+            return None
 
     encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")     
     json_data = [{
@@ -330,6 +699,11 @@ def get_answer_github(q, g_namespace=None):
     repos_to_check = extract_github_repos(search_results_google)
     if not repos_to_check:
         return "从搜索结果中未能提取到有效的GitHub仓库信息。"
+
+    # 先批量获取元数据并排序，README按排序依次读取，达到token上限后不再请求排名靠后的仓库
+    repos_to_check = rank_github_repos(q, fetch_github_repos(repos_to_check))
+    if not repos_to_check:
+        return "搜索到的GitHub仓库均不存在或无权访问。"
     
     safe_q_foldername = windows_compatible_name(q)
     folder_path = f'./auto_search/{safe_q_foldername}'
@@ -353,7 +727,12 @@ def get_answer_github(q, g_namespace=None):
                 current_tokens = jd[0].get('tokens', 0)
 
                 if num_tokens + current_tokens <= 12000:
-                    content_accumulator += f"\n\n--- 内容来源: {repo_info_dict['owner']}/{repo_info_dict['repo']} ---\n" + current_content
+                    meta = f"★ {repo_info_dict['stars']}"
+                    if repo_info_dict['description']:
+                        meta += f"；{repo_info_dict['description']}"
+                    if repo_info_dict['topics']:
+                        meta += f"；topics: {', '.join(repo_info_dict['topics'])}"
+                    content_accumulator += f"\n\n--- 内容来源: {repo_info_dict['owner']}/{repo_info_dict['repo']}（{meta}）---\n" + current_content
                     num_tokens += current_tokens
                     processed_repo_titles.append(jd[0].get('title', f"{repo_info_dict['owner']}_{repo_info_dict['repo']}"))
                 else:
@@ -0,0 +1,199 @@
+import os
+import uuid
+import pickle
+import shutil
+import tempfile
+import weakref
+import threading
+import numpy as np # type: ignore
+import pandas as pd # type: ignore
+
+def _default_root():
+    # Linux 上优先使用基于内存的 /dev/shm，其他平台退回系统临时目录
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+def _is_plain_array(values):
+    return isinstance(values, np.ndarray) and values.dtype.kind in 'biufcmM'
+
+def _write_frame(df, seg_dir):
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df.iloc[:, i]
+        values = series.to_numpy() if isinstance(series.dtype, np.dtype) else None
+        if values is not None and _is_plain_array(values):
+            file_name = f"c{i}.npy"
+            np.save(os.path.join(seg_dir, file_name), np.ascontiguousarray(values), allow_pickle=False)
+            columns.append({'name': name, 'storage': 'array', 'file': file_name})
+        else:
+            # 字符串、类别等列无法直接映射，序列化后同样只存一份
+            file_name = f"c{i}.pkl"
+            with open(os.path.join(seg_dir, file_name), 'wb') as f:
+                pickle.dump(series.reset_index(drop=True), f, protocol=pickle.HIGHEST_PROTOCOL)
+            columns.append({'name': name, 'storage': 'pickle', 'file': file_name})
+
+    index = df.index
+    if isinstance(index, pd.RangeIndex):
+        index_spec = {'storage': 'range', 'start': index.start, 'stop': index.stop, 'step': index.step, 'name': index.name}
+    else:
+        with open(os.path.join(seg_dir, 'index.pkl'), 'wb') as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        index_spec = {'storage': 'pickle', 'file': 'index.pkl'}
+    return {'kind': 'frame', 'dir': seg_dir, 'columns': columns, 'index': index_spec}
+
+def fingerprint(obj):
+    if isinstance(obj, pd.DataFrame):
+        return (obj.shape, tuple(obj.columns), tuple(str(t) for t in obj.dtypes))
+    return (obj.shape, str(obj.dtype))
+
+def write_segment(obj, root_dir):
+    """
+    将 DataFrame 或 NumPy 数组写入 root_dir 下的新数据段目录，返回可跨进程传递的引用描述。
+    不支持的对象类型返回 None。
+    """
+    if isinstance(obj, np.ndarray):
+        if not _is_plain_array(obj):
+            return None
+        seg_dir = os.path.join(root_dir, uuid.uuid4().hex)
+        os.makedirs(seg_dir)
+        np.save(os.path.join(seg_dir, 'array.npy'), np.ascontiguousarray(obj), allow_pickle=False)
+        return {'kind': 'ndarray', 'dir': seg_dir, 'file': 'array.npy'}
+    if isinstance(obj, pd.DataFrame):
+        seg_dir = os.path.join(root_dir, uuid.uuid4().hex)
+        os.makedirs(seg_dir)
+        return _write_frame(obj, seg_dir)
+    return None
+
+def attach(ref):
+    """
+    按引用挂载数据段。数值列以写时复制（mode='c'）的内存映射方式加载，不产生数据拷贝，
+    修改只作用于当前进程的私有页面，不会写回共享数据。
+    """
+    seg_dir = ref['dir']
+    if ref['kind'] == 'ndarray':
+        return np.load(os.path.join(seg_dir, ref['file']), mmap_mode='c')
+
+    index_spec = ref['index']
+    if index_spec['storage'] == 'range':
+        index = pd.RangeIndex(index_spec['start'], index_spec['stop'], index_spec['step'], name=index_spec['name'])
+    else:
+        with open(os.path.join(seg_dir, index_spec['file']), 'rb') as f:
+            index = pickle.load(f)
+
+    data = {}
+    for i, col in enumerate(ref['columns']):
+        path = os.path.join(seg_dir, col['file'])
+        if col['storage'] == 'array':
+            data[i] = pd.Series(np.load(path, mmap_mode='c'), index=index, copy=False)
+        else:
+            with open(path, 'rb') as f:
+                data[i] = pickle.load(f).set_axis(index)
+    df = pd.DataFrame(data, index=index, copy=False)
+    df.columns = [col['name'] for col in ref['columns']]
+    return df
+
+class SharedDataPlane:
+    """
+    会话级共享数据平面：数据工具产生的 DataFrame/NumPy 数组只写入一次，
+    执行进程通过引用挂载（内存映射），无需在进程间复制数据。
+    每个数据段带引用计数：会话本身持有一份，执行任务在运行期间各持有一份，计数归零时删除数据段；
+    会话结束（close）时删除全部数据。
+    """
+    def __init__(self, root_dir=None):
+        base = root_dir or os.getenv('SHARED_DATA_DIR') or _default_root()
+        self.root_dir = os.path.join(base, f"mymanus_{os.getpid()}_{uuid.uuid4().hex[:8]}")
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._segments = {}  # 数据段目录 -> {'ref': 引用, 'refcount': 计数}
+        self._names = {}     # 变量名 -> (数据段目录, 对象弱引用, 结构指纹)
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def publish(self, name, obj):
+        """
+        发布命名对象，返回引用描述；同名变量仍指向同一对象且结构未变时复用已有数据段。
+        不支持的类型返回 None。注意：对同一对象的原地改值不会被检测到。
+        """
+        with self._lock:
+            current = self._names.get(name)
+            if (current and current[0] in self._segments and current[1] is not None
+                    and current[1]() is obj and current[2] == fingerprint(obj)):
+                return self._segments[current[0]]['ref']
+        ref = write_segment(obj, self.root_dir)
+        if ref is None:
+            return None
+        self.adopt(name, ref, obj)
+        return ref
+
+    def adopt(self, name, ref, obj=None):
+        """
+        登记一个已写入本平面目录的数据段（例如执行进程新产生的结果），替换同名的旧数据段。
+        :param obj: 与数据段对应的本进程对象（通常是 attach 的结果），用于后续判断是否需要重新发布
+        """
+        entry = (ref['dir'], weakref.ref(obj), fingerprint(obj)) if obj is not None else (ref['dir'], None, None)
+        with self._lock:
+            self._segments.setdefault(ref['dir'], {'ref': ref, 'refcount': 1})
+            old = self._names.get(name)
+            self._names[name] = entry
+        if old and old[0] != ref['dir']:
+            self.release(old[0])
+
+    def acquire(self, seg_dir):
+        with self._lock:
+            self._segments[seg_dir]['refcount'] += 1
+
+    def release(self, seg_dir):
+        with self._lock:
+            segment = self._segments.get(seg_dir)
+            if segment is None:
+                return
+            segment['refcount'] -= 1
+            if segment['refcount'] > 0:
+                return
+            del self._segments[seg_dir]
+        shutil.rmtree(seg_dir, ignore_errors=True)
+
+    def forget(self, name, obj=None):
+        """
+        注销命名对象并释放会话持有的那份数据段引用（例如变量已落盘或被删除），执行任务持有的引用不受影响。
+        :param obj: 传入时只有平面中登记的仍是该对象才注销，避免误删其他命名空间副本中同名变量的数据段
+        """
+        with self._lock:
+            entry = self._names.get(name)
+            if entry is None or (obj is not None and (entry[1] is None or entry[1]() is not obj)):
+                return
+            del self._names[name]
+        self.release(entry[0])
+
+    def export_namespace(self, g_namespace, min_bytes=0):
+        """
+        将命名空间中的 DataFrame/NumPy 数组发布为共享引用，并为调用方各增加一次引用计数。
+        调用方用完后需对返回引用逐个调用 release(ref['dir'])。
+        :return: {变量名: 引用描述}
+        """
+        refs = {}
+        for name, value in list(g_namespace.items()):
+            if name.startswith('__') or not isinstance(value, (pd.DataFrame, np.ndarray)):
+                continue
+            size = value.nbytes if isinstance(value, np.ndarray) else int(value.memory_usage(deep=False).sum())
+            if size < min_bytes:
+                continue
+            ref = self.publish(name, value)
+            if ref is not None:
+                self.acquire(ref['dir'])
+                refs[name] = ref
+        return refs
+
+    def stats(self):
+        with self._lock:
+            return {'segments': len(self._segments), 'names': len(self._names), 'root_dir': self.root_dir}
+
+    def close(self):
+        """
+        会话结束时删除全部数据段。
+        """
+        with self._lock:
+            self._segments.clear()
+            self._names.clear()
+            self.closed = True
+        shutil.rmtree(self.root_dir, ignore_errors=True)
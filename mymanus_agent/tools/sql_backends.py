@@ -0,0 +1,312 @@
+import os
+import re
+import glob
+import sqlite3
+import threading
+import pymysql # type: ignore
+import pandas as pd # type: ignore
+from dotenv import load_dotenv # type: ignore
+from .sql_planner import SCHEMA_CACHE, load_mysql_schema, explain_mysql
+from .query_cache import QUERY_CACHE
+
+try:
+    import duckdb # type: ignore
+except ImportError: # duckdb 为可选依赖，未安装时使用 SQLite
+    duckdb = None
+
+_META_TABLE = '_mymanus_ingest_meta'
+
+_SHOW_TABLES_RE = re.compile(r'^\s*show\s+(?:full\s+)?tables\s*;?\s*$', re.I)
+_DESCRIBE_RE = re.compile(r'^\s*(?:describe|desc|show\s+(?:full\s+)?columns\s+from)\s+[`"]?([\w$]+)[`"]?\s*;?\s*$', re.I)
+
+class MySQLBackend:
+    """
+    通过 pymysql 访问 .env 中配置的MySQL服务器。
+    """
+    name = 'mysql'
+    errors = (pymysql.Error,)
+
+    def __init__(self, config):
+        self.config = config
+        self.source_key = ('mysql', config['host'], config['port'], config['db'])
+
+    @classmethod
+    def from_env(cls):
+        load_dotenv(override=True)
+        config = {
+            'host': os.getenv('HOST'),
+            'user': os.getenv('USER'),
+            'passwd': os.getenv('MYSQL_PW'),
+            'db': os.getenv('DB_NAME'),
+            'port': os.getenv('PORT'),
+        }
+        if not all(config.values()):
+            return None
+        config['port'] = int(config['port']) # type: ignore
+        return cls(config)
+
+    def connect(self):
+        return pymysql.connect(charset='utf8', **self.config)
+
+    def ensure_fresh(self):
+        # 服务器端数据变化无法在本地感知，依赖写语句失效与缓存TTL
+        pass
+
+    def execute(self, connection, sql_query):
+        with connection.cursor() as cursor:
+            cursor.execute(sql_query)
+            return cursor.fetchall()
+
+    def read_frame(self, connection, sql_query):
+        return pd.read_sql(sql_query, connection)
+
+    def table_info(self, connection, table):
+        return SCHEMA_CACHE.get_table(self.source_key, table,
+                                      lambda: load_mysql_schema(connection, self.config['db']))
+
+    def explain(self, connection, sql_query):
+        return explain_mysql(connection, sql_query)
+
+    def close(self, connection):
+        if connection.open:
+            connection.close()
+
+def _table_name_for(path, with_extension=False):
+    stem, ext = os.path.splitext(os.path.basename(path))
+    name = re.sub(r'\W', '_', stem + ('_' + ext.lstrip('.') if with_extension else ''))
+    return name if not name[:1].isdigit() else f"t_{name}"
+
+def _table_names(paths):
+    """
+    为数据文件分配表名：默认使用文件名（不含扩展名）；多个文件得到同一表名时（如 a.csv 与 a.parquet），
+    这些文件的表名都带上扩展名（a_csv、a_parquet），避免互相覆盖。
+    """
+    by_name = {}
+    for path in paths:
+        by_name.setdefault(_table_name_for(path).lower(), []).append(path)
+    names = {}
+    for group in by_name.values():
+        for path in group:
+            names[path] = _table_name_for(path, with_extension=len(group) > 1)
+        if len(group) > 1:
+            print(f"数据文件 {', '.join(os.path.basename(p) for p in group)} 的表名冲突，"
+                  f"表名改为: {', '.join(names[p] for p in group)}")
+    return names
+
+def _index_columns(table, columns):
+    """
+    需要建立索引的列：LOCAL_SQL_INDEX_COLUMNS 中显式指定的列（格式 表名:列1,列2;表名2:列3），
+    未指定时默认对 id 类列建立索引。
+    """
+    configured = os.getenv('LOCAL_SQL_INDEX_COLUMNS', '')
+    for spec in configured.split(';'):
+        if ':' in spec:
+            t, cols = spec.split(':', 1)
+            if t.strip() == table:
+                return [c.strip() for c in cols.split(',') if c.strip() in columns]
+    return [c for c in columns if c.lower() == 'id' or c.lower().endswith('_id') or c.endswith('ID')]
+
+class LocalBackend:
+    """
+    本地SQL引擎：将数据目录中的 CSV/Parquet 文件一次性导入本地存储（优先 DuckDB 列式存储，未安装时使用 SQLite），
+    文件未变化时直接复用已导入的表，避免重复解析CSV。
+    """
+    name = 'local'
+    _sync_lock = threading.Lock()
+    # 进程内记录已同步的文件签名，文件未变化时跳过元数据查询
+    _synced = {}
+
+    def __init__(self, data_dir=None, store_path=None, engine=None):
+        load_dotenv(override=True)
+        self.data_dir = data_dir or os.getenv('LOCAL_DATA_DIR', './data')
+        self.engine = engine or os.getenv('LOCAL_SQL_ENGINE') or ('duckdb' if duckdb is not None else 'sqlite')
+        if self.engine == 'duckdb' and duckdb is None:
+            print("警告: 未安装duckdb，本地SQL引擎改用SQLite。")
+            self.engine = 'sqlite'
+        suffix = 'duckdb' if self.engine == 'duckdb' else 'sqlite'
+        self.store_path = store_path or os.getenv('LOCAL_SQL_STORE', f'./.mymanus_cache/local_sql.{suffix}')
+        self.source_key = ('local', os.path.abspath(self.store_path))
+        self.errors = (sqlite3.Error, duckdb.Error) if duckdb is not None else (sqlite3.Error,)
+
+    def connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.store_path)), exist_ok=True)
+        if self.engine == 'duckdb':
+            connection = duckdb.connect(self.store_path)
+        else:
+            connection = sqlite3.connect(self.store_path)
+        try:
+            self._sync(connection)
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    def _source_files(self):
+        files = []
+        for pattern in ('*.csv', '*.parquet'):
+            files.extend(glob.glob(os.path.join(self.data_dir, pattern)))
+        return sorted(files)
+
+    def _signatures(self):
+        signatures = {}
+        for path in self._source_files():
+            stat = os.stat(path)
+            signatures[os.path.abspath(path)] = (stat.st_mtime, stat.st_size)
+        return signatures
+
+    def ensure_fresh(self):
+        """
+        数据文件自上次导入后发生变化时，作废该数据源的查询结果缓存。
+        """
+        if self._synced.get(self.source_key) != self._signatures():
+            QUERY_CACHE.invalidate(self.source_key)
+
+    def _sync(self, connection):
+        """
+        将新增或发生变化的数据文件导入本地存储，并删除源文件已不存在（或表名已变化）的表。
+        """
+        signatures = self._signatures()
+        if self._synced.get(self.source_key) == signatures:
+            return
+
+        with self._sync_lock:
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {_META_TABLE} "
+                "(table_name VARCHAR PRIMARY KEY, source_path VARCHAR, mtime DOUBLE, size BIGINT, row_count BIGINT)")
+            known = {row[1]: (row[0], row[2], row[3]) for row in connection.execute(
+                f"SELECT table_name, source_path, mtime, size FROM {_META_TABLE}").fetchall()}
+            for path, (mtime, size) in signatures.items():
+                if size == 0:
+                    print(f"跳过空数据文件: {path}")
+            sources = {path: signature for path, signature in signatures.items() if signature[1] > 0}
+            tables = _table_names(sources)
+            changed = False
+            for path, (table, _, _) in known.items():
+                if tables.get(path) != table:
+                    print(f"数据文件 {path} 已删除或表名已变化，删除本地表 {table}。")
+                    connection.execute(f'DROP TABLE IF EXISTS "{table}"')
+                    connection.execute(f"DELETE FROM {_META_TABLE} WHERE table_name = ?", [table])
+                    changed = True
+            for path, (mtime, size) in sources.items():
+                if known.get(path) == (tables[path], mtime, size):
+                    continue
+                self._ingest(connection, path, tables[path], mtime, size)
+                changed = True
+            if self.engine == 'sqlite':
+                connection.commit()
+            if changed:
+                SCHEMA_CACHE.invalidate(self.source_key)
+                QUERY_CACHE.invalidate(self.source_key)
+            self._synced[self.source_key] = signatures
+
+    def _ingest(self, connection, path, table, mtime, size):
+        print(f"正在将 {path} 导入本地SQL存储，表名: {table} ...")
+        is_parquet = path.lower().endswith('.parquet')
+        if self.engine == 'duckdb':
+            reader = 'read_parquet' if is_parquet else 'read_csv_auto'
+            connection.execute(f'CREATE OR REPLACE TABLE "{table}" AS SELECT * FROM {reader}(?)', [path])
+            columns = [row[0] for row in connection.execute(f'DESCRIBE "{table}"').fetchall()]
+            row_count = connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        else:
+            connection.execute(f'DROP TABLE IF EXISTS "{table}"')
+            row_count = 0
+            if is_parquet:
+                frames = [pd.read_parquet(path)]
+            else:
+                frames = pd.read_csv(path, chunksize=100000)
+            columns = []
+            for frame in frames:
+                frame.to_sql(table, connection, if_exists='append', index=False)
+                row_count += len(frame)
+                columns = list(frame.columns)
+        for column in _index_columns(table, columns):
+            connection.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{column}" ON "{table}" ("{column}")')
+        connection.execute(f"DELETE FROM {_META_TABLE} WHERE table_name = ?", [table])
+        connection.execute(f"INSERT INTO {_META_TABLE} VALUES (?, ?, ?, ?, ?)", [table, path, mtime, size, row_count])
+
+    def _translate(self, sql_query):
+        """
+        把 MySQL 风格的 SHOW TABLES / DESCRIBE 改写为本地引擎的等价查询（SQLite 不支持这两种语句），
+        并从表清单中隐藏记录导入状态的内部表。
+        """
+        if _SHOW_TABLES_RE.match(sql_query):
+            if self.engine == 'duckdb':
+                return ("SELECT table_name AS name FROM information_schema.tables "
+                        f"WHERE table_schema = current_schema() AND table_name <> '{_META_TABLE}' ORDER BY table_name")
+            return ("SELECT name FROM sqlite_master WHERE type IN ('table', 'view') "
+                    f"AND name NOT LIKE 'sqlite_%' AND name <> '{_META_TABLE}' ORDER BY name")
+        match = _DESCRIBE_RE.match(sql_query)
+        if match and self.engine == 'duckdb':
+            # DuckDB 支持 DESCRIBE，但不接受 MySQL 的反引号
+            return f'DESCRIBE "{match.group(1)}"'
+        if match:
+            table = match.group(1).replace("'", "''")
+            return ('SELECT name AS Field, type AS Type, CASE WHEN "notnull" THEN \'NO\' ELSE \'YES\' END AS "Null", '
+                    'CASE WHEN pk THEN \'PRI\' ELSE \'\' END AS "Key", dflt_value AS "Default" '
+                    f"FROM pragma_table_info('{table}') ORDER BY cid")
+        return sql_query
+
+    def execute(self, connection, sql_query):
+        rows = connection.execute(self._translate(sql_query)).fetchall()
+        if self.engine == 'sqlite':
+            # sqlite3 会为写语句隐式开启事务，需要显式提交
+            connection.commit()
+        return rows
+
+    def read_frame(self, connection, sql_query):
+        sql_query = self._translate(sql_query)
+        if self.engine == 'duckdb':
+            return connection.execute(sql_query).df()
+        return pd.read_sql(sql_query, connection)
+
+    def _load_schema(self, connection):
+        schema = {}
+        for table, path, size, row_count in connection.execute(
+                f"SELECT table_name, source_path, size, row_count FROM {_META_TABLE}").fetchall():
+            if self.engine == 'duckdb':
+                columns = [(r[0], r[1]) for r in connection.execute(f'DESCRIBE "{table}"').fetchall()]
+                # expressions 形如 "[col1, col2]"
+                indexes = {r[0]: [c.strip().strip('"') for c in r[1].strip('[]').split(',') if c.strip()]
+                           for r in connection.execute(
+                               "SELECT index_name, expressions FROM duckdb_indexes() WHERE table_name = ?", [table]).fetchall()}
+            else:
+                columns = [(r[1], r[2]) for r in connection.execute(f'PRAGMA table_info("{table}")').fetchall()]
+                indexes = {r[1]: [c[2] for c in connection.execute(f'PRAGMA index_info("{r[1]}")').fetchall()]
+                           for r in connection.execute(f'PRAGMA index_list("{table}")').fetchall()}
+            schema[table] = {
+                'rows': int(row_count or 0),
+                'data_bytes': int(size or 0),
+                'avg_row_bytes': int(size / row_count) if row_count else 0,
+                'columns': columns,
+                'indexes': {name: cols for name, cols in indexes.items() if cols},
+                'source_path': path,
+            }
+        return schema
+
+    def table_info(self, connection, table):
+        return SCHEMA_CACHE.get_table(self.source_key, table, lambda: self._load_schema(connection))
+
+    def explain(self, connection, sql_query):
+        # 本地引擎不提供可比较的行数/代价估计
+        return None
+
+    def close(self, connection):
+        connection.close()
+
+BACKENDS = ('mysql', 'local')
+
+def get_backend(name=None):
+    """
+    按名称获取SQL后端，未指定时读取环境变量 SQL_BACKEND（默认 mysql）。
+    :return: (后端对象, 错误信息)，两者有且仅有一个为 None
+    """
+    load_dotenv(override=True)
+    name = (name or os.getenv('SQL_BACKEND', 'mysql')).lower()
+    if name == 'mysql':
+        backend = MySQLBackend.from_env()
+        if backend is None:
+            return None, "数据库连接信息未在.env文件中完全配置。"
+        return backend, None
+    if name == 'local':
+        return LocalBackend(), None
+    return None, f"未知的SQL后端: {name}，可选值为 {', '.join(BACKENDS)}。"
@@ -0,0 +1,260 @@
+import os
+import re
+import json
+import time
+import threading
+
+# 去掉注释与字符串常量后再做关键字匹配，避免被字符串内容误导。
+# 字符串、反引号标识符与注释在同一个正则中从左到右匹配，谁先出现以谁为准：
+# 字符串中的 -- 或 /* 不会被当作注释，注释中的引号也不会被当作字符串
+_STRING_PATTERN = r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\""
+_SQL_TOKEN_RE = re.compile(r"(?P<string>%s)|(?P<ident>`[^`]*`)|(?P<comment>--[^\n]*|#[^\n]*|/\*.*?\*/)" % _STRING_PATTERN, re.S)
+
+def _mask_token(match):
+    if match.group('string'):
+        return "''"
+    if match.group('ident'):
+        return match.group('ident')
+    return ' '
+
+_SELECT_STAR_RE = re.compile(r'^\s*select\s+(?:distinct\s+)?\*\s+from\s+`?([\w$]+)`?(?:\s*\.\s*`?([\w$]+)`?)?', re.I)
+
+def _strip_sql(sql_query):
+    sql = _SQL_TOKEN_RE.sub(_mask_token, sql_query)
+    return ' '.join(sql.split()).rstrip(';').strip()
+
+_CLAUSE_END = r'(?=\b(?:group\s+by|order\s+by|having|limit|union|window|qualify)\b|$)'
+_WHERE_RE = re.compile(r'\bwhere\b(.*?)' + _CLAUSE_END, re.I)
+_GROUP_BY_RE = re.compile(r'\bgroup\s+by\b(.*?)' + _CLAUSE_END, re.I)
+_COLUMN_REF_RE = re.compile(r'`?([A-Za-z_][\w$]*)`?(?:\s*\.\s*`?([A-Za-z_][\w$]*)`?)?')
+
+def _clause_columns(pattern, sql):
+    """
+    子句中引用的列名（tbl.col 取 col），关键字等非列名的单词由调用方与表字段比对后自然排除。
+    """
+    columns = set()
+    for clause in pattern.findall(sql):
+        clause = re.sub(r"''", ' ', clause)
+        for match in _COLUMN_REF_RE.finditer(clause):
+            columns.add((match.group(2) or match.group(1)).lower())
+    return columns
+
+def analyze_select(sql_query):
+    """
+    粗略分析一条查询语句的形态，用于判断是否为无约束的全表提取。
+    :param sql_query: SQL语句
+    :return: dict，包含 select_star、table、has_limit、filter_columns（WHERE 中引用的列）、
+             group_columns（GROUP BY 的列）等字段。JOIN 本身不限制结果行数，不视为约束
+    """
+    sql = _strip_sql(sql_query)
+    lowered = sql.lower()
+    match = _SELECT_STAR_RE.match(sql)
+    table = None
+    if match:
+        # 支持 db.table 写法，取最后一段作为表名
+        table = match.group(2) or match.group(1)
+    return {
+        'select_star': bool(match),
+        'table': table,
+        'has_limit': bool(re.search(r'\blimit\b', lowered)),
+        'filter_columns': _clause_columns(_WHERE_RE, sql),
+        'group_columns': _clause_columns(_GROUP_BY_RE, sql),
+        'is_select': lowered.startswith('select') or lowered.startswith('with'),
+    }
+
+def is_bounded(shape, info):
+    """
+    查询是否受到有效约束：带 LIMIT，或 WHERE 过滤 / GROUP BY 聚合作用在索引的首列上。
+    :param shape: analyze_select 的结果
+    :param info: 表信息（含 indexes），未知时为 None
+    """
+    if shape['has_limit']:
+        return True
+    if not info:
+        return False
+    indexed = {cols[0].lower() for cols in info['indexes'].values() if cols}
+    return bool(indexed & (shape['filter_columns'] | shape['group_columns']))
+
+_READ_ONLY_KEYWORDS = ('select', 'show', 'describe', 'desc', 'explain', 'with')
+_WRITE_KEYWORDS_RE = re.compile(r'\b(?:insert|update|delete|replace|merge|create|drop|alter|truncate)\b')
+
+def is_read_only(sql_query):
+    """
+    判断语句是否为只读查询（SELECT/SHOW/DESCRIBE/EXPLAIN 等）。
+    """
+    sql = _strip_sql(sql_query).lower()
+    if not sql:
+        return False
+    first_keyword = sql.split(None, 1)[0].strip('(')
+    if first_keyword not in _READ_ONLY_KEYWORDS:
+        return False
+    # WITH ... 之后可以跟 UPDATE/DELETE/INSERT，CTE 中也可能包含写语句，需检查整条语句
+    if first_keyword == 'with' and _WRITE_KEYWORDS_RE.search(sql):
+        return False
+    return not re.search(r'\binto\s+(outfile|dumpfile)\b|\bfor\s+update\b', sql)
+
+# 每次执行结果都可能不同的函数与抽样子句，包含它们的查询不进入结果缓存
+_NON_DETERMINISTIC_RE = re.compile(
+    r'\b(?:now|rand|random|uuid|uuid_short|gen_random_uuid|sysdate|curdate|curtime|unix_timestamp|'
+    r'utc_timestamp|utc_date|utc_time|current_timestamp|current_date|current_time|localtime|localtimestamp|'
+    r'last_insert_id|connection_id|found_rows|row_count|setseed)\s*\(|'
+    r'\b(?:current_timestamp|current_date|current_time|localtime|localtimestamp)\b|'
+    r'\btablesample\b|\busing\s+sample\b', re.I)
+
+def is_deterministic(sql_query):
+    """
+    判断查询结果是否只取决于数据本身（不包含 NOW()、RAND()、UUID() 等每次执行结果都不同的函数），
+    只有这样的查询才能缓存结果。
+    """
+    return not _NON_DETERMINISTIC_RE.search(_strip_sql(sql_query))
+
+class SchemaStatsCache:
+    """
+    数据表结构与统计信息缓存（表行数、数据量、字段、索引），按数据源惰性加载，过期后在下次访问时刷新。
+    """
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else float(os.getenv('SQL_SCHEMA_CACHE_TTL', '600'))
+        self._schemas = {}
+        self._lock = threading.Lock()
+
+    def get_schema(self, source_key, loader):
+        """
+        获取某个数据源的全部表信息。
+        :param source_key: 数据源标识，例如 (host, port, db)
+        :param loader: 无参可调用对象，返回 {表名: 表信息} 字典
+        """
+        with self._lock:
+            entry = self._schemas.get(source_key)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                return entry[1]
+        schema = loader()
+        with self._lock:
+            self._schemas[source_key] = (time.monotonic(), schema)
+        return schema
+
+    def get_table(self, source_key, table, loader):
+        schema = self.get_schema(source_key, loader)
+        if table in schema:
+            return schema[table]
+        # MySQL 在部分系统上表名大小写不敏感
+        lowered = {name.lower(): info for name, info in schema.items()}
+        return lowered.get(table.lower())
+
+    def invalidate(self, source_key=None):
+        with self._lock:
+            if source_key is None:
+                self._schemas.clear()
+            else:
+                self._schemas.pop(source_key, None)
+
+SCHEMA_CACHE = SchemaStatsCache()
+
+def load_mysql_schema(connection, db):
+    """
+    从 information_schema 一次性读取当前库所有表的行数估计、数据量、字段与索引信息。
+    """
+    schema = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_NAME, TABLE_ROWS, DATA_LENGTH, AVG_ROW_LENGTH "
+            "FROM information_schema.TABLES WHERE TABLE_SCHEMA = %s", (db,))
+        for name, rows, data_length, avg_row_length in cursor.fetchall():
+            schema[name] = {
+                'rows': int(rows or 0),
+                'data_bytes': int(data_length or 0),
+                'avg_row_bytes': int(avg_row_length or 0),
+                'columns': [],
+                'indexes': {},
+            }
+        cursor.execute(
+            # COLUMN_TYPE 保留显示宽度（如 tinyint(1)），画像据此识别布尔字段
+            "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, ORDINAL_POSITION", (db,))
+        for name, column, data_type in cursor.fetchall():
+            if name in schema:
+                schema[name]['columns'].append((column, data_type))
+        cursor.execute(
+            "SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX", (db,))
+        for name, index, column in cursor.fetchall():
+            if name in schema:
+                schema[name]['indexes'].setdefault(index, []).append(column)
+    return schema
+
+def explain_mysql(connection, sql_query):
+    """
+    对查询执行 EXPLAIN，返回预估扫描行数与代价；失败时返回 None。
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN FORMAT=JSON " + sql_query.strip().rstrip(';'))
+            plan = json.loads(cursor.fetchone()[0])
+    except Exception:
+        return None
+
+    query_block = plan.get('query_block', {})
+    cost = query_block.get('cost_info', {}).get('query_cost')
+    rows = 0
+    # 嵌套的表访问节点中都带有 rows_examined_per_scan，累加得到总扫描行数估计
+    stack = [query_block]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if 'rows_examined_per_scan' in node:
+                rows += int(node['rows_examined_per_scan'])
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return {'estimated_rows': rows, 'cost': float(cost) if cost is not None else None}
+
+def _format_bytes(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024:
+            return f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}TB"
+
+def plan_extraction(sql_query, table_info_getter, explain=None, explain_runner=None):
+    """
+    在提取数据前检查查询：对大表上的无约束 SELECT * 给出警告或拒绝，并建议投影列。
+    :param sql_query: 待执行的SQL语句
+    :param table_info_getter: 接收表名、返回表信息(或None)的可调用对象
+    :param explain: 是否先执行 EXPLAIN；为 None 时读取环境变量 SQL_EXPLAIN_FIRST
+    :param explain_runner: 接收SQL、返回 EXPLAIN 结果的可调用对象
+    :return: dict，包含 reject(是否拒绝执行)、notes(需要反馈给模型的说明列表)
+    """
+    policy = os.getenv('SQL_SELECT_STAR_POLICY', 'warn').lower()
+    large_rows = int(os.getenv('SQL_LARGE_TABLE_ROWS', '100000'))
+    if explain is None:
+        explain = os.getenv('SQL_EXPLAIN_FIRST', '0') == '1'
+
+    notes = []
+    reject = False
+    shape = analyze_select(sql_query)
+
+    if policy != 'off' and shape['select_star'] and not shape['has_limit'] and shape['table']:
+        try:
+            info = table_info_getter(shape['table'])
+        except Exception as e:
+            info = None
+            print(f"读取表 {shape['table']} 的统计信息失败: {e}")
+        if info and info['rows'] >= large_rows and not is_bounded(shape, info):
+            columns = ', '.join(c for c, _ in info['columns'][:12])
+            size = _format_bytes(info['data_bytes'])
+            notes.append(
+                f"表 {shape['table']} 约有 {info['rows']} 行（{size}），无约束的 SELECT * 会传输整张表。"
+                f"建议只选择需要的列（可用列: {columns}{' ...' if len(info['columns']) > 12 else ''}），"
+                f"并通过 WHERE/LIMIT 过滤，或直接在SQL中用 GROUP BY 完成聚合。"
+            )
+            if info['indexes']:
+                indexed = ', '.join(sorted({cols[0] for cols in info['indexes'].values()}))
+                notes.append(f"表 {shape['table']} 上的索引列: {indexed}")
+            reject = policy == 'reject'
+
+    if explain and shape['is_select'] and explain_runner is not None and not reject:
+        plan = explain_runner(sql_query)
+        if plan:
+            cost = f"，预估代价 {plan['cost']}" if plan['cost'] is not None else ''
+            notes.append(f"执行计划预估扫描约 {plan['estimated_rows']} 行{cost}。")
+
+    return {'reject': reject, 'notes': notes}
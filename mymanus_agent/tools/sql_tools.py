@@ -1,84 +1,130 @@
-import os
-import pymysql # type: ignore
 import json
-import pandas as pd # type: ignore
-from dotenv import load_dotenv # type: ignore
+from .sql_planner import SCHEMA_CACHE, plan_extraction, is_read_only, is_deterministic
+from .sql_backends import get_backend
+from .query_cache import QUERY_CACHE
+from .shared_data import attach
 
-def sql_inter(sql_query, g_namespace=None): 
+def _rows_to_json(rows):
+    # 不同后端返回的日期、Decimal 等类型统一转为字符串
+    return json.dumps([list(row) for row in rows], default=str)
+
+def sql_inter(sql_query, g_namespace=None, backend=None, use_cache=True):
     """
     用于执行一段SQL代码，并最终获取SQL代码执行结果。
+    只读查询的结果会被缓存，写语句会作废同一数据源的全部缓存。
+    :param backend: SQL后端，mysql 或 local（本地CSV/Parquet数据），为None时读取环境变量 SQL_BACKEND
+    :param use_cache: 为False时跳过结果缓存，强制重新执行
     """
     print("正在调用sql_inter工具运行SQL代码...")
-    load_dotenv(override=True) 
-    host = os.getenv('HOST')
-    user = os.getenv('USER')
-    mysql_pw = os.getenv('MYSQL_PW')
-    db = os.getenv('DB_NAME')
-    port = os.getenv('PORT')
-    
-    if not all([host, user, mysql_pw, db, port]):
-        return "数据库连接信息未在.env文件中完全配置。"
+    db_backend, error = get_backend(backend)
+    if error:
+        return error
+
+    read_only = is_read_only(sql_query)
+    cacheable = read_only and is_deterministic(sql_query)
+    if cacheable and use_cache:
+        db_backend.ensure_fresh()
+        cached = QUERY_CACHE.get('rows', db_backend.source_key, sql_query)
+        if cached is not None:
+            print("命中查询结果缓存，直接返回结果...")
+            return cached
 
     try:
-        connection = pymysql.connect(
-            host=host,  
-            user=user, 
-            passwd=mysql_pw,  
-            db=db,
-            port=int(port), # type: ignore
-            charset='utf8',
-        )
-    except pymysql.Error as e:
+        connection = db_backend.connect()
+    except Exception as e:
         return f"数据库连接失败: {e}"
-    
-    results_json = "[]" 
+
+    results_json = "[]"
     try:
-        with connection.cursor() as cursor: # type: ignore
-            cursor.execute(sql_query)
-            results = cursor.fetchall()
-            print("SQL代码已顺利运行，正在整理答案...")
-            results_json = json.dumps(results)
-    except pymysql.Error as e:
+        results = db_backend.execute(connection, sql_query)
+        print("SQL代码已顺利运行，正在整理答案...")
+        results_json = _rows_to_json(results)
+        if cacheable:
+            QUERY_CACHE.put('rows', db_backend.source_key, sql_query, results_json)
+        elif not read_only:
+            # 写操作或DDL可能改变表结构与数据，作废统计信息与查询结果缓存
+            SCHEMA_CACHE.invalidate(db_backend.source_key)
+            QUERY_CACHE.invalidate(db_backend.source_key)
+    except db_backend.errors as e:
         return f"SQL执行错误: {e}"
     finally:
-        if 'connection' in locals() and connection.open: # type: ignore
-            connection.close() # type: ignore
+        db_backend.close(connection)
     return results_json
 
-def extract_data(sql_query, df_name, g_namespace):
+def _describe_frame(df_name, df):
+    mem = df.memory_usage(deep=True).sum() / 1024 / 1024
+    return "已成功创建pandas对象：%s，该变量保存了同名表格信息（%d 行 × %d 列，约 %.2f MB）" % (df_name, df.shape[0], df.shape[1], mem)
+
+def _share(df_name, df, data_plane):
+    # 发布到共享数据平面后，命名空间中保存的是挂载的内存映射版本，主进程与执行进程共用同一份数据
+    if data_plane is None:
+        return df
+    ref = data_plane.publish(df_name, df)
+    if ref is None:
+        return df
+    shared = attach(ref)
+    data_plane.adopt(df_name, ref, shared)
+    return shared
+
+def extract_data(sql_query, df_name, g_namespace, explain=None, backend=None, use_cache=True, data_plane=None):
     """
-    借助pymysql将MySQL中的某张表读取并保存到g_namespace。
+    将数据库中的某张表读取并保存到g_namespace。
+    提取前会借助表统计信息缓存检查查询，对大表上无约束的 SELECT * 给出警告或拒绝执行。
+    相同查询再次提取时直接复用缓存中的DataFrame（Copy-on-Write共享），不重新下载。
+    :param explain: 是否在提取前执行 EXPLAIN 并将预估行数与代价反馈给模型
+    :param backend: SQL后端，mysql 或 local（本地CSV/Parquet数据），为None时读取环境变量 SQL_BACKEND
+    :param use_cache: 为False时跳过结果缓存，强制重新提取
+    :param data_plane: 共享数据平面（SharedDataPlane），传入时提取结果只写入共享内存一次，供执行进程按引用挂载
     """
     print("正在调用extract_data工具运行SQL代码...")
-    load_dotenv(override=True)
-    
-    host = os.getenv('HOST')
-    user = os.getenv('USER')
-    mysql_pw = os.getenv('MYSQL_PW')
-    db = os.getenv('DB_NAME')
-    port = os.getenv('PORT')
+    db_backend, error = get_backend(backend)
+    if error:
+        return error
 
-    if not all([host, user, mysql_pw, db, port]):
-        return "数据库连接信息未在.env文件中完全配置。"
+    read_only = is_read_only(sql_query)
+    cacheable = read_only and is_deterministic(sql_query)
+    if cacheable and use_cache and not explain:
+        db_backend.ensure_fresh()
+        cached = QUERY_CACHE.get('frame', db_backend.source_key, sql_query)
+        if cached is not None:
+            g_namespace[df_name] = _share(df_name, cached, data_plane)
+            print("命中查询结果缓存，已复用之前提取的数据...")
+            return _describe_frame(df_name, cached) + "（来自查询缓存）"
 
     try:
-        connection = pymysql.connect(
-            host=host,  
-            user=user, 
-            passwd=mysql_pw,  
-            db=db,
-            port=int(port), # type: ignore
-            charset='utf8',
-        )
-    except pymysql.Error as e:
+        connection = db_backend.connect()
+    except Exception as e:
         return f"数据库连接失败: {e}"
-        
+
     try:
-        g_namespace[df_name] = pd.read_sql(sql_query, connection) # type: ignore
+        plan = plan_extraction(
+            sql_query,
+            table_info_getter=lambda table: db_backend.table_info(connection, table),
+            explain=explain,
+            explain_runner=lambda q: db_backend.explain(connection, q),
+        )
+        notes = '\n'.join(plan['notes'])
+        if plan['reject']:
+            print("查询被拒绝：大表上的无约束 SELECT *。")
+            return f"已拒绝执行该查询。\n{notes}"
+
+        try:
+            df = db_backend.read_frame(connection, sql_query)
+        finally:
+            if not read_only:
+                # 与 sql_inter 相同：只有写操作或DDL才作废统计信息与查询结果缓存；
+                # 写语句不返回结果集时读取会报错，但语句可能已经执行，同样需要作废
+                SCHEMA_CACHE.invalidate(db_backend.source_key)
+                QUERY_CACHE.invalidate(db_backend.source_key)
+        if cacheable:
+            QUERY_CACHE.put('frame', db_backend.source_key, sql_query, df)
+        g_namespace[df_name] = _share(df_name, df, data_plane)
         print("代码已顺利执行，正在进行结果梳理...")
-        return "已成功创建pandas对象：%s，该变量保存了同名表格信息" % df_name
-    except Exception as e: 
+        result = _describe_frame(df_name, df)
+        if notes:
+            result += "\n" + notes
+        return result
+    except Exception as e:
         return f"从数据库提取数据时出错: {e}"
     finally:
-        if 'connection' in locals() and connection.open: # type: ignore
-            connection.close() # type: ignore
+        db_backend.close(connection)